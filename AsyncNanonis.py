@@ -0,0 +1,225 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import asyncio
+import collections
+import socket
+
+from CommandRegistry import ExternalCommand, NormalCommand
+from ExternalConnections import AsyncExternalConnectionPool
+from NanonisCodec import BODY_SIZE_STRUCT, HEADER_SIZE, checkBodySize
+from PyNanonis import NanonisInterface
+
+class SyncBridge():
+    """Blocking view of an AsyncNanonisInterface for code running in a worker thread,
+    e.g. the special commands. Calls of command() are scheduled on the event loop.
+    All other attributes are taken from the asynchronous interface.
+    """
+    def __init__(self, interface, loop):
+        self.interface = interface
+        self.loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self.interface, name)
+
+    def command(self, cmdAlias, cmdArgs):
+        future = asyncio.run_coroutine_threadsafe(self.interface.command(cmdAlias, cmdArgs), self.loop)
+        return future.result()
+
+class AsyncNanonisInterface(NanonisInterface):
+    """Nanonis TCP interface based on asyncio streams.
+
+    Uses the same command lists and codecs as NanonisInterface, but connect(), disconnect(),
+    command(), commandBatch() and externalCommand() are coroutines. Several coroutines can
+    issue commands concurrently: the requests are written immediately and kept in a queue,
+    the responses are matched to the requests in FIFO order by a reader task.
+    """
+    def __init__(self):
+        super().__init__()
+        self.reader = None
+        self.writer = None
+        self.readerTask = None
+        self.pending = collections.deque()
+        self.externalConnections = AsyncExternalConnectionPool()
+
+    async def connect(self, ip, port):
+        """Connects to the Nanonis software via the TCP interface.
+
+        Args:
+            ip (str): IP adress of the TCP interface.
+            port (int): Port of the TCP interface.
+
+        Returns:
+            bool: Connection status. True: Connected. False: Disconnected.
+        """
+        try:
+            self.reader, self.writer = await asyncio.open_connection(ip, port)
+            self.writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connected = True
+            self.readerTask = asyncio.create_task(self.readResponses())
+        except OSError:
+            self.connected = False
+
+        return self.connected
+
+    async def disconnect(self):
+        """Disconnects from the Nanonis software. Pending requests fail with an error.
+
+        Returns:
+            bool: Connection status. True: Connected. False: Disconnected.
+        """
+        if self.connected:
+            self.connected = False
+            self.readerTask.cancel()
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.failPending()
+
+        return self.connected
+
+    def failPending(self):
+        """Resolves all pending requests with an error.
+        """
+        while len(self.pending) > 0:
+            _, future = self.pending.popleft()
+            if not future.done():
+                future.set_result((True, ''))
+
+    async def readResponses(self):
+        """Reads the response messages and resolves the pending requests in FIFO order.
+        """
+        try:
+            while True:
+                header = await self.reader.readexactly(HEADER_SIZE)
+                body = await self.reader.readexactly(checkBodySize(BODY_SIZE_STRUCT.unpack_from(header)[0]))
+                codec, future = self.pending.popleft()
+                try:
+                    resp = (False, codec.decode(body, 0))
+                except Exception:
+                    # The body has been read completely, so the following responses are still in sync
+                    resp = (True, '')
+                # The request may have been cancelled by its caller in the meantime
+                if not future.done():
+                    future.set_result(resp)
+        except (asyncio.IncompleteReadError, OSError, ValueError, IndexError):
+            # The framing of the stream is lost, therefore the connection is closed.
+            self.connected = False
+            self.failPending()
+            self.writer.close()
+
+    async def sendCommand(self, codec, request):
+        """Sends an already encoded request message and waits for the decoded response.
+
+        Args:
+            codec (CommandCodec): Codec of the command.
+            request (bytes or list): Request message encoded by the codec, or list of buffers.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        if not self.connected:
+            return True, ''
+        future = self.queueRequest(codec, request)
+        await self.writer.drain()
+        return await future
+
+    def queueRequest(self, codec, request):
+        """Writes a request message and appends it to the queue of pending requests.
+        Writing and queueing happen without interruption, so the order of the queue
+        always matches the order of the requests on the connection.
+
+        Args:
+            codec (CommandCodec): Codec of the command.
+            request (bytes or list): Request message encoded by the codec, or list of buffers.
+
+        Returns:
+            asyncio.Future: Future of the tuple (Error (True/False), Decoded response message).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((codec, future))
+        if isinstance(request, (list, tuple)):
+            self.writer.writelines(request)
+        else:
+            self.writer.write(request)
+        return future
+
+    async def command(self, cmdAlias, cmdArgs):
+        """Executes a (normal) command, i.e. a single command.
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        resp = ''
+        err = False
+        handler = self.registry.get(cmdAlias)
+        if isinstance(handler, NormalCommand):
+            if len(cmdArgs) == len(handler.args):
+                err, resp = await self.sendCommand(handler.codec, handler.codec.encode(cmdArgs))
+        elif isinstance(handler, ExternalCommand):
+            err, resp = await self.externalCommand(handler.interfaceCmds, cmdAlias, cmdArgs)
+        elif handler is not None:
+            # Special commands are blocking and run in a worker thread
+            loop = asyncio.get_running_loop()
+            err, resp = await loop.run_in_executor(None, handler.execute, SyncBridge(self, loop), cmdArgs)
+
+        return err, resp
+
+    async def commandBatch(self, cmds):
+        """Executes several commands. Consecutive normal commands are written back-to-back
+        before their responses are awaited. All other commands are awaited one after the other.
+
+        Args:
+            cmds (list): List of tuples (cmdAlias, cmdArgs).
+
+        Returns:
+            list: List of tuples (Error (True/False), Decoded response message).
+        """
+        results = []
+        futures = []
+        for cmdAlias, cmdArgs in cmds:
+            handler = self.registry.get(cmdAlias)
+            if self.connected and isinstance(handler, NormalCommand) and len(cmdArgs) == len(handler.args):
+                futures.append(self.queueRequest(handler.codec, handler.codec.encode(cmdArgs)))
+            else:
+                if len(futures) > 0:
+                    await self.writer.drain()
+                    results.extend(await asyncio.gather(*futures))
+                    futures = []
+                results.append(await self.command(cmdAlias, cmdArgs))
+        if len(futures) > 0:
+            await self.writer.drain()
+            results.extend(await asyncio.gather(*futures))
+        return results
+
+    async def externalCommand(self, interfaceCmds, cmdAlias, cmdArgs):
+        """Executes an external command. The commands are sent to the external interfaces via TCP.
+
+        Args:
+            interfaceCmds (dict): Dictionary containing commands of external interface.
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            bool, str: Error (True/False), Response message.
+        """
+        resp = ''
+        err = False
+
+        interface = interfaceCmds['Interface']
+        request = self.encodeExternalRequest(interfaceCmds, cmdAlias, cmdArgs)
+
+        if request is not None:
+            try:
+                connection = self.externalConnections.get(interface)
+                resp = (await connection.request(request.encode())).decode()
+            except OSError:
+                err = True
+                resp = "Could not connect to external interface."
+
+        return err, resp
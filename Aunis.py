@@ -8,7 +8,14 @@ import numpy as np
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtWidgets import QApplication, QMainWindow
 
+import config as cfg
+from AunisScript import ScriptCompiler, ScriptError, ScriptRunner
+from CommandCache import CommandWatcher
+from CommandExecutor import INTERACTIVE, SCRIPT, TELEMETRY, CommandExecutor, ExecutorClient
+from LogView import LogView
+from LogWriter import LogWriter
 from PyNanonis import NanonisInterface
+from Telemetry import Telemetry
 
 from UI.ui_Aunis import Ui_Aunis
 
@@ -17,47 +24,38 @@ class runScriptThread(QtCore.QThread):
 
     def __init__(self):
         super(runScriptThread, self).__init__()
-        self.script = ''
+        self.plan = None
         self.cancelScript = False
         self.nni = None
+        self.traceFile = None
+        self.recordFolder = None
 
     def run(self):
-        """Executes the commands one after the other.
-        Non-nested loops are also possible.
+        """Executes the compiled script. If a trace file is set, the timing of all 
+        commands is recorded and saved as Chrome trace, together with a summary of the metrics.
+        Values of "record" lines are saved in the record folder.
         """        
-        repeat_counter = 0
-        repeat_startindex = 0
-        repeat_loop = False
-        script = self.script
-        all_cmds = script.split('\n')
-        index = 0
-        while index < len(all_cmds) and self.cancelScript == False:
-            cmdLine = all_cmds[index]
-            if len(cmdLine) > 1:
-                cmd = cmdLine.split(' ')
-                cmdAlias = cmd[0]
-                cmdArgs = cmd[1:]
-                if cmdAlias == 'repeat':
-                    repeat_counter = np.int(cmdArgs[0])
-                    repeat_loop = True
-                    repeat_startindex = index
-                elif cmdAlias == 'end' and repeat_loop == True:
-                    if repeat_counter == 0:
-                        repeat_loop = False
-                        repeat_startindex = 0
-                    else:
-                        repeat_counter -= 1
-                        if repeat_counter > 0:
-                            index = repeat_startindex
-                else:
-                    self.logSignal.emit('Request', cmdLine)
-                    err, resp = self.nni.command(cmdAlias, cmdArgs)
-                    if len(resp) > 0:
-                        self.logSignal.emit('Response', str(resp)) 
-                    print(cmdLine)      
-            index += 1
+        if self.traceFile is not None:
+            self.nni.metrics.startTrace()
+        recorder = None
+        if self.plan.recording:
+            from Recorder import Recorder
+            recorder = Recorder(self.recordFolder)
+        runner = ScriptRunner(self.nni, self.logSignal.emit, lambda: self.cancelScript, recorder)
+        try:
+            runner.run(self.plan)
+        finally:
+            if recorder is not None:
+                recorder.close()
+        if self.traceFile is not None:
+            self.nni.metrics.stopTrace().exportChromeTrace(self.traceFile)
+            self.nni.metrics.exportSummary(os.path.splitext(self.traceFile)[0] + '-summary.json')
 
 class AunisUI(QMainWindow):
+    registryChanged = QtCore.Signal(object)
+    reloadFailed = QtCore.Signal(str)
+    commandFinished = QtCore.Signal(str, object)
+
     def __init__(self):
         super(AunisUI, self).__init__()
         self.uiAu = Ui_Aunis()
@@ -70,6 +68,7 @@ class AunisUI(QMainWindow):
 
         self.log_folder = 'logs'
         self.log_date = time.strftime('%Y-%m-%d %H%M%S', time.localtime())
+        self.logWriter = LogWriter(os.path.join(self.log_folder, self.log_date))
 
         self.updateUI()
         self.startUp()
@@ -79,6 +78,7 @@ class AunisUI(QMainWindow):
         """ 
         self.fileIcon = 'UI\\Aunis.svg'
         self.setWindowIcon(QtGui.QIcon(self.fileIcon))
+        self.logView = LogView(self.uiAu.status_Log, self.uiAu.status_LogFilter)
 
         # app.aboutToQuit.connect(self.closeEvent)   
         self.uiAu.menuSaveFile.triggered.connect(self.saveScript)
@@ -88,7 +88,7 @@ class AunisUI(QMainWindow):
         self.uiAu.status_Connect.clicked.connect(self.connect)
         self.uiAu.status_Disconnect.clicked.connect(self.disconnect)
         self.uiAu.status_Feedback.clicked.connect(self.switchFBOnOff)
-        self.uiAu.status_Refresh.clicked.connect(self.updateStatus)
+        self.uiAu.status_Refresh.clicked.connect(lambda: self.telemetry.refresh(True))
         self.uiAu.scripting_Run.clicked.connect(self.runScript)
         self.uiAu.scripting_Stop.clicked.connect(self.stopScript)
         self.uiAu.tipman_Yplus.clicked.connect(self.moveTipYplus)
@@ -102,6 +102,20 @@ class AunisUI(QMainWindow):
         """Initializes the Nanonis Interface.
         """        
         self.nni = NanonisInterface()
+        self.executor = CommandExecutor(self.nni)
+        self.interactive = ExecutorClient(self.executor, INTERACTIVE)
+        self.current = None
+        self.bias = None
+        self.fbStatus = None
+        self.telemetry = Telemetry(ExecutorClient(self.executor, TELEMETRY), isBusy=self.threadScript.isRunning)
+        self.telemetry.valueChanged.connect(self.showTelemetry)
+        self.telemetry.start()
+        self.uiAu.scripting_Script.setCommandRegistry(self.nni.registry)
+        self.commandFinished.connect(self.showCommandResult)
+        self.registryChanged.connect(self.commandsReloaded)
+        self.reloadFailed.connect(lambda msg: self.logCommand('Reload', msg))
+        self.watcher = CommandWatcher(self.nni, self.registryChanged.emit, self.reloadFailed.emit)
+        self.watcher.start()
         self.loadExternalInterfaces()
         self.updateStatus()
 
@@ -110,90 +124,141 @@ class AunisUI(QMainWindow):
         """        
         ip = self.uiAu.settings_NanonisIP.text()
         port = np.int64(self.uiAu.settings_NanonisPort.text())
-        self.connected = self.nni.connect(ip, port)
+        self.connected = self.interactive.connect(ip, port)
         self.updateStatus()
     
     def disconnect(self):
         """Disconnects from the Nanonis.
         """        
-        self.connected = self.nni.disconnect()
+        self.connected = self.interactive.disconnect()
         self.updateStatus()
     
     def updateStatus(self):
-        """Updates the connection status and the setpoint values.
+        """Updates the connection status. The setpoint values are updated by the telemetry.
         """        
         if self.connected:
             self.uiAu.status_Status.setText('Connected')
             self.uiAu.status_Status.setStyleSheet('color: rgb(0,0,0); background-color: rgb(51,209,122);')
-            self.getSetpoint()
-            self.getFBStatus()
+            self.telemetry.refresh(True)
         else:
             self.uiAu.status_Status.setText('Disonnected')
             self.uiAu.status_Status.setStyleSheet('color: rgb(0,0,0); background-color: rgb(237,51,59);')
 
     @QtCore.Slot(str, str)
     def logCommand(self, msgType, message):
-        """Saves an executed command and/or response message into a log file.
+        """Shows an executed command and/or response message and passes it to the log writer.
 
         Args:
             msgType (str): Request or Response
             message (str): Message text.
         """        
-        directory = os.path.join(self.log_folder, self.log_date)
-        if not os.path.exists(directory):
-            os.mkdir(directory)
-        
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-        log = os.path.join(directory, '{}.log'.format('cmds'))
-        data = '{}\t{}\t{}\n'.format(timestamp, msgType, message)
+        self.logWriter.write(msgType, message)
 
-        cursor = QtGui.QTextCursor(self.uiAu.status_Log.document())
-        cursor.setPosition(0)
-        self.uiAu.status_Log.setTextCursor(cursor)
-        self.uiAu.status_Log.insertPlainText(data)
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        self.logView.append('{}\t{}\t{}'.format(timestamp, msgType, message))
 
-        with open(log, 'a+') as f:           
-            f.write(data)
+    @QtCore.Slot(str, object)
+    def showTelemetry(self, getter, resp):
+        """Displays a value published by the telemetry.
 
-    def getSetpoint(self):
-        """Reads out and displays the setpoint values.
-        """        
-        err, resp = self.nni.command("getCurrent", [])
-        I = resp['Z-Controller setpoint'] / 1e-12
-        err, resp = self.nni.command("getBias", [])
-        V = resp['Bias value (V)'] / 1e-3
-        setpoint = '{:.2f} pA; {:.2f} mV'.format(I, V)
+        Args:
+            getter (str): Alias of the getter.
+            resp (dict): Decoded response message.
+        """
+        if getter == 'getCurrent':
+            self.current = resp['Z-Controller setpoint']
+            self.showSetpoint()
+        elif getter == 'getBias':
+            self.bias = resp['Bias value (V)']
+            self.showSetpoint()
+        elif getter == 'getFeedback':
+            self.fbStatus = resp['Z-Controller status']
+            self.showFBStatus()
+
+    def showSetpoint(self):
+        """Displays the setpoint values.
+        """
+        if self.current is None or self.bias is None:
+            return
+        setpoint = '{:.2f} pA; {:.2f} mV'.format(self.current / 1e-12, self.bias / 1e-3)
         self.uiAu.status_Setpoint.setText(setpoint)
 
+    def runInteractive(self, cmdAlias, cmdArgs):
+        """Executes a command in the interactive lane without blocking the user interface.
+        The result is passed to showCommandResult() via the signal commandFinished.
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdArgs (list): Command arguments.
+        """
+        future = self.interactive.commandAsync(cmdAlias, cmdArgs)
+        future.add_done_callback(lambda f: self.commandFinished.emit(cmdAlias, f))
+
+    @QtCore.Slot(str, object)
+    def showCommandResult(self, cmdAlias, future):
+        """Logs failed commands from the user interface and updates the status.
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            future (Future): Result of the command (error, decoded response message).
+        """
+        try:
+            err, resp = future.result()
+        except Exception as e:
+            self.logCommand('Error', '{}: {}'.format(cmdAlias, e))
+            return
+        if err:
+            self.logCommand('Error', '{}: {}'.format(cmdAlias, resp))
+        self.telemetry.refresh()
+
     def switchFBOnOff(self):
-        """Switches the feedback on or off.
+        """Switches the feedback on or off. The current status is read before switching, since
+        the status shown by the telemetry may be outdated while a script is running.
         """        
-        err, resp = self.nni.command("getFeedback", [])
-        fbStatus = resp["Z-Controller status"]
-        if fbStatus == 0:
-            err, resp = self.nni.command("setFeedback", [1])
-        if fbStatus == 1:
-            err, resp = self.nni.command("setFeedback", [0])
-        time.sleep(1)
-        self.getFBStatus()
+        future = self.interactive.runAsync(self.toggleFeedback)
+        future.add_done_callback(lambda f: self.commandFinished.emit('setFeedback', f))
+
+    def toggleFeedback(self):
+        """Reads the feedback status and sets the opposite one. Called in the background worker of the interactive client.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        err, resp = self.interactive.command("getFeedback", [])
+        if err or len(resp) == 0:
+            return True, resp
+        return self.interactive.command("setFeedback", [0 if resp['Z-Controller status'] == 1 else 1])
     
-    def getFBStatus(self):
-        """Reads out and displays the feedback status.
+    def showFBStatus(self):
+        """Displays the feedback status.
         """        
-        err, resp = self.nni.command("getFeedback", [])
-        if resp["Z-Controller status"] == 0:
+        if self.fbStatus == 0:
             self.uiAu.status_Feedback.setText('Off')
             self.uiAu.status_Feedback.setStyleSheet('color: rgb(0,0,0); background-color: rgb(237,51,59);')
-        if resp["Z-Controller status"] == 1:
+        if self.fbStatus == 1:
             self.uiAu.status_Feedback.setText('On')
             self.uiAu.status_Feedback.setStyleSheet('color: rgb(0,0,0); background-color: rgb(51,209,122);')
 
     def runScript(self):
-        """Starts the execution of the current script.
+        """Compiles the current script and starts its execution.
         """        
-        self.threadScript.nni = self.nni
-        self.threadScript.script = self.uiAu.scripting_Script.toPlainText()
+        if self.threadScript.isRunning():
+            return
+        try:
+            plan = ScriptCompiler(self.nni).compile(self.uiAu.scripting_Script.toPlainText())
+        except ScriptError as e:
+            self.showErrorMessage(str(e))
+            return
+        self.threadScript.nni = ExecutorClient(self.executor, SCRIPT)
+        self.threadScript.plan = plan
+        directory = os.path.join(self.log_folder, self.log_date)
+        timestamp = time.strftime('%H%M%S', time.localtime())
+        if cfg.TRACE_SCRIPTS:
+            os.makedirs(directory, exist_ok=True)
+            self.threadScript.traceFile = os.path.join(directory, 'trace-{}.json'.format(timestamp))
+        self.threadScript.recordFolder = os.path.join(directory, 'record-{}'.format(timestamp))
         self.threadScript.cancelScript = False
+        self.nni.cancelEvent.clear()
         self.threadScript.start()
       
     def stopScript(self):
@@ -201,42 +266,55 @@ class AunisUI(QMainWindow):
         """        
         if self.threadScript.isRunning():
             self.threadScript.cancelScript = True
+            self.nni.cancelEvent.set()
     
     def moveTipXplus(self):
         """Moves the tip in X+ direction by the specified amount.
         """        
         dx = self.uiAu.tipman_dx.value() * 1e-10
-        err, resp = self.nni.command("addX", [dx])
+        self.runInteractive("addX", [dx])
 
     def moveTipXminus(self):
         """Moves the tip in X- direction by the specified amount.
         """        
         dx = (-1) * self.uiAu.tipman_dx.value() * 1e-10
-        err, resp = self.nni.command("addX", [dx])
+        self.runInteractive("addX", [dx])
     
     def moveTipYplus(self):
         """Moves the tip in Y+ direction by the specified amount.
         """        
         dy = self.uiAu.tipman_dy.value() * 1e-10
-        err, resp = self.nni.command("addY", [dy])
+        self.runInteractive("addY", [dy])
 
     def moveTipYminus(self):
         """Moves the tip in Y- direction by the specified amount.
         """        
         dy = (-1) * self.uiAu.tipman_dy.value() * 1e-10
-        err, resp = self.nni.command("addY", [dy])
+        self.runInteractive("addY", [dy])
 
     def moveTipZplus(self):
         """Moves the tip in Z+ direction by the specified amount.
         """        
         dz = self.uiAu.tipman_dz.value() * 1e-10
-        err, resp = self.nni.command("addZ", [dz])
+        self.runInteractive("addZ", [dz])
 
     def moveTipZminus(self):
         """Moves the tip in Z- direction by the specified amount.
         """        
         dz = (-1) * self.uiAu.tipman_dz.value() * 1e-10
-        err, resp = self.nni.command("addZ", [dz])
+        self.runInteractive("addZ", [dz])
+
+    @QtCore.Slot(object)
+    def commandsReloaded(self, registry):
+        """Updates the user interface after the command definitions have been reloaded.
+
+        Args:
+            registry (CommandRegistry): New command registry.
+        """
+        self.uiAu.scripting_Script.setCommandRegistry(registry)
+        self.uiAu.external_Interfaces.clearContents()
+        self.loadExternalInterfaces()
+        self.logCommand('Reload', 'Command definitions reloaded.')
 
     def loadExternalInterfaces(self):
         """Loads and displays all external TCP interfaces.
@@ -263,7 +341,7 @@ class AunisUI(QMainWindow):
         msgbox = QtWidgets.QMessageBox()
         msgbox.setWindowIcon(QtGui.QIcon(self.fileIcon))
         msgbox.setWindowTitle('Information')
-        msgbox.setIcon(QtWidgets.QMessageBox.information)
+        msgbox.setIcon(QtWidgets.QMessageBox.Icon.Information)
         msgbox.setText(msg)
         msgbox.exec()
 
@@ -311,6 +389,11 @@ class AunisUI(QMainWindow):
     def closeEvent(self, event: QtGui.QCloseEvent):
         try:
             self.stopScript()
+            self.watcher.stop()
+            self.telemetry.stop()
+            self.executor.stop()
+            self.nni.externalConnections.closeAll()
+            self.logWriter.close()
         except:
             pass
         return super().closeEvent(event)
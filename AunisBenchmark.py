@@ -0,0 +1,195 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+"""Benchmarks of the codec, the transport and the script runner.
+
+Usage: python AunisBenchmark.py --output results.json
+
+All network benchmarks run against the local simulator (NanonisSimulator.py). The results
+are written as JSON, so that the numbers of different versions can be compared.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import config as cfg
+from AunisScript import ScriptCompiler, ScriptRunner
+from NanonisCodec import HEADER_SIZE, ResponseLayout
+from NanonisSimulator import HEADER_STRUCT, NanonisSimulator, SimulatorModel
+from PyNanonis import NanonisInterface
+
+def timePerCall(fn, minTime=0.2):
+    """Measures the mean duration of a function call.
+    The number of calls is increased until the measurement takes at least minTime.
+
+    Args:
+        fn (callable): Function without arguments.
+        minTime (float, optional): Minimum duration of the measurement (s). Defaults to 0.2.
+
+    Returns:
+        float: Duration per call (s).
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime:
+            return elapsed / number
+        number *= 2 if elapsed <= 0 else max(2, int(minTime / elapsed * 1.2))
+
+def percentiles(values):
+    """Returns the statistics of a list of durations.
+
+    Args:
+        values (list): Durations (s).
+
+    Returns:
+        dict: Count, mean, p50, p95, p99 and max (s).
+    """
+    values = sorted(values)
+    n = len(values)
+    def rank(p):
+        return values[min(n - 1, int(p / 100 * n))]
+    return {'count': n, 'mean': sum(values) / n, 'p50': rank(50), 'p95': rank(95), 'p99': rank(99), 'max': values[-1]}
+
+def legacyDecode(nni, resp, respTypes):
+    """Original decoder of the response messages (one conversion per field), kept as baseline.
+    Only single values can be decoded.
+    """
+    index = HEADER_SIZE
+    decodedResp = {}
+    for key, value in respTypes.items():
+        size = len(nni.convertNumberToByte(0, value))
+        decodedResp[key] = nni.convertBytesToNumber(resp[index:index+size], value)
+        index += size
+    return decodedResp
+
+def benchmarkCodec(nni, simulator, minTime):
+    """Encoding and decoding time per command: legacy functions of NanonisInterface and precompiled codecs.
+    """
+    results = {}
+    for cmdAlias, cmdDef in nni.commandList.items():
+        codec = nni.commandCodecs[cmdAlias]
+        command = simulator.commands[cmdDef['cmdName']]
+        body = command.encodeResponse(simulator.model.execute(cmdDef['cmdName'], {}))
+        resp = HEADER_STRUCT.pack(codec.cmdName, len(body), 0, 0) + body
+        args = [cmdDef['argValues'].get(arg, 0) for arg in cmdDef['args']]
+        results[cmdAlias] = {
+            # The legacy functions cannot encode length-prefixed arguments
+            'encodeLegacy': timePerCall(lambda: nni.encodeRequestMessage(cmdDef['cmdName'], 1, cmdDef['argValues'], cmdDef['argTypes']), minTime)
+                            if codec.requestSegments is None else None,
+            'encode': timePerCall(lambda: codec.encode(args), minTime),
+            # The original decoder only supports single values
+            'decodeLegacy': timePerCall(lambda: legacyDecode(nni, resp, cmdDef['respTypes']), minTime)
+                            if all(step[0] == ResponseLayout.SCALARS for step in codec.respLayout.steps) else None,
+            'decode': timePerCall(lambda: codec.decode(resp), minTime),
+        }
+    return results
+
+def benchmarkTransport(nni, count):
+    """Latency of sequential commands and throughput of pipelined commands.
+    """
+    durations = []
+    for _ in range(count):
+        start = time.perf_counter()
+        nni.command('getZ', [])
+        durations.append(time.perf_counter() - start)
+    sequential = percentiles(durations)
+    sequential['commandsPerSecond'] = 1 / sequential['mean']
+
+    start = time.perf_counter()
+    nni.commandBatch([('getZ', [])] * count)
+    elapsed = time.perf_counter() - start
+    return {'sequential': sequential, 'pipelined': {'count': count, 'commandsPerSecond': count / elapsed}}
+
+def benchmarkScriptRunner(nni, count):
+    """Time per executed script line compared to sending the same commands directly.
+    """
+    script = 'repeat {}\ngetZ\naddBias 0\nend'.format(count)
+    plan = ScriptCompiler(nni).compile(script)
+    start = time.perf_counter()
+    ScriptRunner(nni, lambda msgType, message: None).run(plan)
+    runner = (time.perf_counter() - start) / (2 * count)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        nni.command('getZ', [])
+        nni.command('addBias', [0])
+    direct = (time.perf_counter() - start) / (2 * count)
+    return {'lines': 2 * count, 'perLine': runner, 'directPerLine': direct, 'overheadPerLine': runner - direct}
+
+def benchmarkMemory(nni, count):
+    """Memory growth of the client during a long script run. Allocations of the simulator are ignored.
+    """
+    def discard(msgType, message):
+        pass
+    compiler = ScriptCompiler(nni)
+    # Warm-up, e.g. creates the metrics of the commands
+    ScriptRunner(nni, discard).run(compiler.compile('getZ\nsetBias 0.1'))
+    plan = compiler.compile('repeat {}\ngetZ\nsetBias 0.1\nend'.format(count))
+    filters = [tracemalloc.Filter(False, '*NanonisSimulator.py'), tracemalloc.Filter(False, '*socketserver.py')]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(filters)
+    ScriptRunner(nni, discard).run(plan)
+    after = tracemalloc.take_snapshot().filter_traces(filters)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return {'lines': 2 * count, 'growth': growth, 'growthPerLine': growth / (2 * count), 'peak': peak}
+
+def gitVersion():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of Aunis.')
+    parser.add_argument('--output', metavar='FILE', help='JSON file of the results (default: stdout).')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency of the simulator (s).')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Jitter of the simulator (s).')
+    parser.add_argument('--count', type=int, default=2000, help='Number of commands per network benchmark.')
+    parser.add_argument('--quick', action='store_true', help='Shorter measurements.')
+    args = parser.parse_args(argv)
+    minTime = 0.02 if args.quick else 0.2
+    count = max(args.count // 10, 1) if args.quick else args.count
+
+    simulator = NanonisSimulator(port=0, latency=args.latency, jitter=args.jitter, model=SimulatorModel())
+    host, port = simulator.start()
+    nni = NanonisInterface()
+    if not nni.connect(host, port):
+        print('Could not connect to the simulator.', file=sys.stderr)
+        return 3
+    try:
+        results = {
+            'version': gitVersion(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'settings': {'latency': args.latency, 'jitter': args.jitter, 'count': count,
+                         'pipelineDepth': cfg.PIPELINE_DEPTH, 'headerSize': HEADER_SIZE},
+            'codec': benchmarkCodec(nni, simulator, minTime),
+            'transport': benchmarkTransport(nni, count),
+            'scriptRunner': benchmarkScriptRunner(nni, count),
+            'memory': benchmarkMemory(nni, count * 5),
+        }
+    finally:
+        nni.disconnect()
+        simulator.stop()
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+"""Headless runner for Aunis scripts, e.g. for cron jobs and cluster schedulers.
+
+Usage: python -m AunisCLI run script.txt --host 127.0.0.1 --port 6501
+
+Qt is not imported and the interface is only loaded after the arguments are parsed.
+"""
+
+import time
+
+START = time.perf_counter()
+
+import argparse
+import sys
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_CONNECTION = 3
+EXIT_CANCELLED = 130
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog='AunisCLI', description='Runs Aunis scripts without the GUI.')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    run = subparsers.add_parser('run', help='Runs a script.')
+    run.add_argument('script', help='Script file.')
+    run.add_argument('--host', default='127.0.0.1', help='IP adress of the Nanonis TCP interface (default: 127.0.0.1).')
+    run.add_argument('--port', type=int, default=6501, help='Port of the Nanonis TCP interface (default: 6501).')
+    run.add_argument('--check', action='store_true', help='Only compile the script, do not connect.')
+    run.add_argument('--trace', metavar='FILE', help='Save a Chrome trace of all commands.')
+    run.add_argument('--record', metavar='FOLDER', help='Folder of the values recorded by "record" lines (default: record-[date]-[time]).')
+    run.add_argument('--quiet', action='store_true', help='Do not print the requests and responses.')
+    return parser.parse_args(argv)
+
+def printMessage(msgType, message):
+    print('{}\t{}'.format(msgType, message), flush=True)
+
+def run(args):
+    """Compiles and executes a script.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        int: Exit code.
+    """
+    from AunisScript import ScriptCompiler, ScriptError, ScriptRunner
+    from PyNanonis import NanonisInterface
+
+    try:
+        with open(args.script, 'r') as f:
+            script = f.read()
+    except OSError as e:
+        print('Could not read script: {}'.format(e), file=sys.stderr)
+        return EXIT_USAGE
+
+    nni = NanonisInterface()
+    try:
+        plan = ScriptCompiler(nni).compile(script)
+    except ScriptError as e:
+        print(e, file=sys.stderr)
+        return EXIT_USAGE
+    print('Startup: {:.1f} ms'.format((time.perf_counter() - START) * 1e3), file=sys.stderr)
+    if args.check:
+        return EXIT_OK
+
+    if not nni.connect(args.host, args.port):
+        print('Could not connect to {}:{}.'.format(args.host, args.port), file=sys.stderr)
+        return EXIT_CONNECTION
+    if args.trace:
+        nni.metrics.startTrace()
+    recorder = None
+    if plan.recording:
+        from Recorder import Recorder
+        recorder = Recorder(args.record or time.strftime('record-%Y%m%d-%H%M%S', time.localtime()))
+    runner = ScriptRunner(nni, None if args.quiet else printMessage, nni.cancelEvent.is_set, recorder)
+    try:
+        runner.run(plan)
+    except KeyboardInterrupt:
+        nni.cancelEvent.set()
+        print('Cancelled.', file=sys.stderr)
+        return EXIT_CANCELLED
+    finally:
+        if args.trace:
+            nni.metrics.stopTrace().exportChromeTrace(args.trace)
+        if recorder is not None:
+            recorder.close()
+        nni.disconnect()
+        nni.externalConnections.closeAll()
+    if runner.errors > 0:
+        print('{} command(s) failed.'.format(runner.errors), file=sys.stderr)
+        return EXIT_ERROR
+    return EXIT_OK
+
+def main(argv=None):
+    args = parseArguments(argv)
+    if args.action == 'run':
+        return run(args)
+    return EXIT_USAGE
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,747 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import math
+import operator
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import config as cfg
+from CommandRegistry import NormalCommand
+from NanonisCodec import FLOAT_TYPES, INTEGER_TYPES, parseType
+
+KEYWORDS = ['repeat', 'sweep', 'gridspec', 'pointspec', 'parallel', 'branch', 'end', 'record', 'waituntil']
+
+# Comparison operators of waituntil
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+# Tokens are separated by whitespace, lists are enclosed in square brackets, e.g. [0.1, 0.2, 0.5],
+# and field names in quotation marks, e.g. "Z (m)"
+TOKEN = re.compile(r'\[[^\]]*\]|"[^"]*"|\S+')
+
+def tokenize(line):
+    """Splits a script line into tokens.
+
+    Args:
+        line (str): Script line.
+
+    Returns:
+        list: Tokens.
+    """
+    return TOKEN.findall(line)
+
+def parseList(token):
+    """Parses a list token, e.g. [0.1, 0.2, 0.5].
+
+    Args:
+        token (str): List token.
+
+    Returns:
+        list: Elements of the list (str). None if the token is not a list.
+    """
+    if not (token.startswith('[') and token.endswith(']')):
+        return None
+    return [item for item in re.split(r'[\s,]+', token[1:-1]) if len(item) > 0]
+
+class ScriptError(Exception):
+    """Error in a script, detected while compiling the script.
+    """
+    def __init__(self, lineNumber, message):
+        super().__init__('Line {}: {}'.format(lineNumber, message))
+        self.lineNumber = lineNumber
+
+class CommandStep():
+    """Execution of a single command. Requests of normal commands are encoded in advance.
+    """
+    __slots__ = ('line', 'lineNumber', 'cmdAlias', 'cmdArgs', 'codec', 'request')
+
+    def __init__(self, line, lineNumber, cmdAlias, cmdArgs, codec=None, request=None):
+        self.line = line
+        self.lineNumber = lineNumber
+        self.cmdAlias = cmdAlias
+        self.cmdArgs = cmdArgs
+        self.codec = codec
+        self.request = request
+
+    def execute(self, runner):
+        runner.log('Request', self.line)
+        if self.codec is not None:
+            err, resp = runner.nni.sendCommand(self.codec, self.request)
+        else:
+            err, resp = runner.nni.command(self.cmdAlias, self.cmdArgs)
+        runner.logResponse(err, resp)
+
+class BatchStep():
+    """Pipelined execution of consecutive normal commands. The commands do not depend on
+    each other, so all requests are sent before the responses are read.
+    """
+    __slots__ = ('steps',)
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def execute(self, runner):
+        for step in self.steps:
+            runner.log('Request', step.line)
+        for err, resp in runner.nni.sendPipelined([(step.codec, step.request) for step in self.steps]):
+            runner.logResponse(err, resp)
+
+class RecordStep():
+    """Execution of a normal command whose response fields are recorded (record ...).
+    The timestamp of a sample is the middle between sending the request and receiving the response.
+    Each record line has its own stream, named after the line (command, arguments and fields).
+    A sample that does not match the stream (e.g. an array of different size) is not recorded
+    and counts as failed command.
+    """
+    __slots__ = ('line', 'lineNumber', 'stream', 'codec', 'request', 'fields')
+
+    def __init__(self, line, lineNumber, stream, codec, request, fields=None):
+        self.line = line
+        self.lineNumber = lineNumber
+        self.stream = stream
+        self.codec = codec
+        self.request = request
+        self.fields = fields
+
+    def execute(self, runner):
+        runner.log('Request', self.line)
+        before = time.monotonic()
+        err, resp = runner.nni.sendCommand(self.codec, self.request)
+        after = time.monotonic()
+        runner.logResponse(err, resp)
+        if not err and runner.recorder is not None:
+            if self.fields is not None:
+                resp = {field: resp[field] for field in self.fields}
+            try:
+                runner.recorder.append(self.stream, resp, (before + after) / 2)
+            except ValueError as e:
+                runner.errors += 1
+                runner.log('Error', 'Line {}: Not recorded: {}'.format(self.lineNumber, e))
+
+class WaitUntilStep():
+    """Waits until the value of a getter fulfils a condition (waituntil ...). The poll interval adapts to
+    the value: while it approaches the threshold, the next poll is scheduled after half of the estimated
+    time until the threshold is reached, otherwise the interval is doubled. The interval is limited to
+    config.WAIT_UNTIL_MIN_INTERVAL ... config.WAIT_UNTIL_MAX_INTERVAL and the wait ends immediately
+    if nni.cancelEvent is set. A timeout counts as failed command.
+    """
+    __slots__ = ('line', 'lineNumber', 'codec', 'request', 'field', 'comparison', 'threshold', 'timeout')
+
+    def __init__(self, line, lineNumber, codec, request, field, comparison, threshold, timeout=None):
+        self.line = line
+        self.lineNumber = lineNumber
+        self.codec = codec
+        self.request = request
+        self.field = field
+        self.comparison = comparison
+        self.threshold = threshold
+        self.timeout = timeout
+
+    def execute(self, runner):
+        runner.log('Request', self.line)
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else math.inf
+        interval = cfg.WAIT_UNTIL_MIN_INTERVAL
+        previous = None
+        while True:
+            err, resp = runner.nni.sendCommand(self.codec, self.request)
+            now = time.monotonic()
+            if err or self.comparison(resp[self.field], self.threshold):
+                runner.logResponse(err, resp)
+                return
+            if now >= deadline:
+                runner.errors += 1
+                runner.log('Error', 'Timeout after {:.10g} s: {} = {:.10g}'.format(self.timeout, self.field, resp[self.field]))
+                return
+            current = (now, resp[self.field])
+            interval = self.nextInterval(interval, previous, current)
+            previous = current
+            if runner.nni.cancelEvent.wait(min(interval, deadline - now)) or runner.isCancelled():
+                return
+
+    def nextInterval(self, interval, previous, current):
+        """Calculates the time until the next poll.
+
+        Args:
+            interval (float): Last interval (s).
+            previous (tuple): Time and value of the previous poll. None for the first poll.
+            current (tuple): Time and value of the current poll.
+
+        Returns:
+            float: Interval (s).
+        """
+        if previous is not None and current[0] > previous[0]:
+            distance = abs(self.threshold - current[1])
+            approach = (abs(self.threshold - previous[1]) - distance) / (current[0] - previous[0])
+            if approach > 0:
+                return min(max(distance / approach / 2, cfg.WAIT_UNTIL_MIN_INTERVAL), cfg.WAIT_UNTIL_MAX_INTERVAL)
+        return min(interval * 2, cfg.WAIT_UNTIL_MAX_INTERVAL)
+
+class BlockStep():
+    """Step containing a block of steps that is closed by "end".
+    """
+    __slots__ = ('lineNumber', 'body')
+
+    def __init__(self, lineNumber):
+        self.lineNumber = lineNumber
+        self.body = []
+
+class LoopStep(BlockStep):
+    """Repeated execution of a block of steps (repeat ... end). Loops can be nested.
+    """
+    __slots__ = ('count',)
+
+    def __init__(self, lineNumber, count):
+        super().__init__(lineNumber)
+        self.count = count
+
+    def execute(self, runner):
+        for _ in range(self.count):
+            if runner.isCancelled():
+                return
+            runner.runSteps(self.body)
+
+class SweepStep(BlockStep):
+    """Execution of a block of steps for each value of a parameter series (sweep ... end).
+    The requests of the setter are encoded in advance for all values. If the block contains
+    only normal commands, the requests of several points are pipelined. Sweeps can be nested.
+    """
+    __slots__ = ('codec', 'values', 'requests')
+
+    def __init__(self, lineNumber, codec, values):
+        super().__init__(lineNumber)
+        self.codec = codec
+        self.values = values
+        self.requests = codec.encodeSeries([0], 0, values)
+
+    def execute(self, runner):
+        if all(isinstance(step, BatchStep) or (isinstance(step, CommandStep) and step.codec is not None) for step in self.body):
+            self.executePipelined(runner)
+            return
+        for value, request in zip(self.values, self.requests):
+            if runner.isCancelled():
+                return
+            runner.log('Request', self.label(value))
+            err, resp = runner.nni.sendCommand(self.codec, request)
+            runner.logResponse(err, resp)
+            runner.runSteps(self.body)
+
+    def executePipelined(self, runner):
+        bodySteps = []
+        for step in self.body:
+            bodySteps.extend(step.steps if isinstance(step, BatchStep) else [step])
+        bodyRequests = [(step.codec, step.request) for step in bodySteps]
+        pointsPerChunk = max(1, cfg.PIPELINE_DEPTH // (1 + len(bodySteps)))
+        for start in range(0, len(self.values), pointsPerChunk):
+            if runner.isCancelled():
+                return
+            requests = []
+            for i in range(start, min(len(self.values), start + pointsPerChunk)):
+                runner.log('Request', self.label(self.values[i]))
+                for step in bodySteps:
+                    runner.log('Request', step.line)
+                requests.append((self.codec, self.requests[i]))
+                requests.extend(bodyRequests)
+            for err, resp in runner.nni.sendPipelined(requests):
+                runner.logResponse(err, resp)
+
+    def label(self, value):
+        return '{} {:.10g}'.format(self.codec.alias, value)
+
+class PositionStep(SweepStep):
+    """Execution of a block of steps at each of a series of tip positions (gridspec/pointspec ... end).
+    The positions are sent as absolute values with the setter (setXY), the position is not read back.
+    Like sweeps, the requests of several points are pipelined if the block contains only normal commands.
+    """
+    __slots__ = ()
+
+    def __init__(self, lineNumber, codec, points):
+        BlockStep.__init__(self, lineNumber)
+        self.codec = codec
+        self.values = points
+        self.requests = [codec.encode([x, y]) for x, y in points]
+
+    def label(self, value):
+        return '{} {:.10g} {:.10g}'.format(self.codec.alias, value[0], value[1])
+
+class ParallelStep(BlockStep):
+    """Concurrent execution of branches (parallel ... branch ... end), e.g. a command of an
+    external interface while the Nanonis software is prepared. Each branch runs in its own
+    thread, "end" waits for all branches. Commands of the Nanonis software are still executed
+    one after the other, but they can overlap with commands of external interfaces and waits.
+    Failed commands and errors are collected per branch.
+    """
+    __slots__ = ('branches',)
+
+    def __init__(self, lineNumber):
+        super().__init__(lineNumber)
+        self.branches = [(lineNumber, self.body)]
+
+    def addBranch(self, lineNumber):
+        """Starts the next branch.
+
+        Args:
+            lineNumber (int): Line number of "branch".
+        """
+        self.body = []
+        self.branches.append((lineNumber, self.body))
+
+    def execute(self, runner):
+        pool = ThreadPoolExecutor(max_workers=len(self.branches), thread_name_prefix='ScriptBranch')
+        try:
+            futures = [pool.submit(runner.runBranch, steps) for _, steps in self.branches]
+            wait(futures)
+        finally:
+            pool.shutdown(wait=False)
+        for index, ((lineNumber, _), future) in enumerate(zip(self.branches, futures), 1):
+            try:
+                errors = future.result()
+            except Exception as e:
+                runner.errors += 1
+                runner.log('Error', 'Branch {} (line {}): {}'.format(index, lineNumber, e))
+                continue
+            if errors > 0:
+                runner.errors += errors
+                runner.log('Error', 'Branch {} (line {}): {} command(s) failed.'.format(index, lineNumber, errors))
+
+class ScriptPlan():
+    """Executable plan of a compiled script.
+    """
+    def __init__(self, steps, recording=False):
+        """
+        Args:
+            steps (list): Compiled steps.
+            recording (bool, optional): The script records values (record ...). Defaults to False.
+        """
+        self.steps = steps
+        self.recording = recording
+
+class ScriptCompiler():
+    """Compiles a script once into an executable plan. Commands are resolved, the number
+    and types of the arguments are validated and the requests of normal commands are
+    encoded, so that errors are detected before the execution starts.
+    """
+    def __init__(self, nni):
+        """
+        Args:
+            nni (NanonisInterface): Interface providing the command lists.
+        """
+        self.nni = nni
+
+    def compile(self, script):
+        """Compiles a script.
+
+        Args:
+            script (str): Script text.
+
+        Raises:
+            ScriptError: If the script contains an error.
+
+        Returns:
+            ScriptPlan: Executable plan.
+        """
+        root = []
+        blocks = [(None, root)]
+        recording = False
+        for lineNumber, line in enumerate(script.split('\n'), 1):
+            tokens = tokenize(line)
+            if len(tokens) == 0:
+                continue
+            keyword = tokens[0]
+            if keyword == 'repeat':
+                if len(tokens) != 2:
+                    raise ScriptError(lineNumber, 'Syntax: repeat [count]')
+                loop = LoopStep(lineNumber, self.parseCount(lineNumber, tokens[1]))
+                blocks[-1][1].append(loop)
+                blocks.append((loop, loop.body))
+            elif keyword == 'sweep':
+                sweep = self.compileSweep(lineNumber, tokens[1:])
+                blocks[-1][1].append(sweep)
+                blocks.append((sweep, sweep.body))
+            elif keyword == 'gridspec' or keyword == 'pointspec':
+                positions = self.compilePositions(lineNumber, keyword, tokens[1:])
+                blocks[-1][1].append(positions)
+                blocks.append((positions, positions.body))
+            elif keyword == 'parallel':
+                if len(tokens) != 1:
+                    raise ScriptError(lineNumber, 'Syntax: parallel')
+                parallel = ParallelStep(lineNumber)
+                blocks[-1][1].append(parallel)
+                blocks.append((parallel, parallel.body))
+            elif keyword == 'branch':
+                if len(tokens) != 1 or not isinstance(blocks[-1][0], ParallelStep):
+                    raise ScriptError(lineNumber, '"branch" is only allowed directly inside "parallel".')
+                parallel = blocks.pop()[0]
+                parallel.addBranch(lineNumber)
+                blocks.append((parallel, parallel.body))
+            elif keyword == 'end':
+                if len(blocks) == 1:
+                    raise ScriptError(lineNumber, '"end" without "repeat", "sweep", "gridspec", "pointspec" or "parallel".')
+                blocks.pop()
+            elif keyword == 'waituntil':
+                blocks[-1][1].append(self.compileWaitUntil(line.strip(), lineNumber, tokens[1:]))
+            elif keyword == 'record':
+                blocks[-1][1].append(self.compileRecord(line.strip(), lineNumber, tokens[1:]))
+                recording = True
+            else:
+                blocks[-1][1].append(self.compileCommand(line.strip(), lineNumber, keyword, tokens[1:]))
+        if len(blocks) > 1:
+            raise ScriptError(blocks[-1][0].lineNumber, 'Block is not closed by "end".')
+        return ScriptPlan(self.groupBatches(root), recording)
+
+    def parseCount(self, lineNumber, token):
+        """Parses a non-negative number of iterations.
+
+        Args:
+            lineNumber (int): Line number.
+            token (str): Number of iterations.
+
+        Raises:
+            ScriptError: If the token is not a non-negative integer.
+
+        Returns:
+            int: Number of iterations.
+        """
+        try:
+            count = int(token)
+        except ValueError:
+            raise ScriptError(lineNumber, 'Invalid number of iterations "{}".'.format(token))
+        if count < 0:
+            raise ScriptError(lineNumber, 'Invalid number of iterations "{}".'.format(token))
+        return count
+
+    def compileSweep(self, lineNumber, args):
+        """Compiles the header of a sweep. Syntax:
+
+            sweep [setter] [start] [stop] [number of points]         (linear)
+            sweep [setter] [start] [stop] [step]                     (linear, step is not an integer)
+            sweep [setter] [start] [stop] [number of points] log     (logarithmic)
+            sweep [setter] [[value1, value2, ...]]                   (list of values)
+
+        Args:
+            lineNumber (int): Line number.
+            args (list): Tokens following the keyword.
+
+        Raises:
+            ScriptError: If the sweep is invalid.
+
+        Returns:
+            SweepStep: Compiled sweep (without block).
+        """
+        syntax = 'Syntax: sweep [setter] [start] [stop] [number of points|step] [log] or sweep [setter] [[values]]'
+        if len(args) < 2:
+            raise ScriptError(lineNumber, syntax)
+        handler = self.nni.registry.get(args[0])
+        if not isinstance(handler, NormalCommand) or len(handler.args) != 1:
+            raise ScriptError(lineNumber, '"{}" is not a normal command with a single argument.'.format(args[0]))
+        try:
+            items = parseList(args[1])
+            if items is not None and len(args) == 2:
+                values = [float(item) for item in items]
+            elif len(args) == 4 or (len(args) == 5 and args[4] == 'log'):
+                start, stop = float(args[1]), float(args[2])
+                values = self.sweepValues(start, stop, args[3], len(args) == 5)
+            else:
+                raise ScriptError(lineNumber, syntax)
+            return SweepStep(lineNumber, handler.codec, values)
+        except (ValueError, struct.error) as e:
+            raise ScriptError(lineNumber, 'Invalid sweep: {}'.format(e))
+
+    def sweepValues(self, start, stop, points, logarithmic):
+        """Calculates the values of a sweep.
+
+        Args:
+            start (float): First value.
+            stop (float): Last value.
+            points (str): Number of points (integer) or step size.
+            logarithmic (bool): Logarithmically spaced values.
+
+        Raises:
+            ValueError: If the parameters are invalid.
+
+        Returns:
+            numpy.ndarray: Values.
+        """
+        import numpy as np
+        try:
+            n = int(points)
+        except ValueError:
+            step = float(points)
+            if logarithmic or step == 0 or (stop - start) / step < 0:
+                raise ValueError('Invalid step size {}.'.format(points))
+            # The tolerance keeps stop if it is a multiple of the step, values beyond stop are never sent
+            n = int(math.floor((stop - start) / step + 1e-9)) + 1
+            return start + step * np.arange(n)
+        if n < 1:
+            raise ValueError('Invalid number of points {}.'.format(points))
+        if logarithmic:
+            if start * stop <= 0:
+                raise ValueError('Logarithmic sweeps require start and stop with the same sign.')
+            return np.geomspace(start, stop, n)
+        return np.linspace(start, stop, n)
+
+    def compilePositions(self, lineNumber, keyword, args):
+        """Compiles the header of a grid or a list of positions. The positions are ordered
+        to reduce the travel distance of the tip. Syntax:
+
+            gridspec [x0] [y0] [x1] [y1] [nx] [ny] [serpentine|raster|nearest]   (default: serpentine)
+            pointspec [file] [nearest|none]                                       (default: nearest)
+
+        Args:
+            lineNumber (int): Line number.
+            keyword (str): "gridspec" or "pointspec".
+            args (list): Tokens following the keyword.
+
+        Raises:
+            ScriptError: If the header is invalid.
+
+        Returns:
+            PositionStep: Compiled positions (without block).
+        """
+        from GridSpectroscopy import gridPoints, loadPoints, orderPoints
+        handler = self.nni.registry.get('setXY')
+        if not isinstance(handler, NormalCommand) or len(handler.args) != 2:
+            raise ScriptError(lineNumber, '"setXY" is not a normal command with the arguments X and Y.')
+        try:
+            if keyword == 'gridspec':
+                if len(args) not in (6, 7) or (len(args) == 7 and args[6] not in ('serpentine', 'raster', 'nearest')):
+                    raise ScriptError(lineNumber, 'Syntax: gridspec [x0] [y0] [x1] [y1] [nx] [ny] [serpentine|raster|nearest]')
+                order = args[6] if len(args) == 7 else 'serpentine'
+                points = gridPoints(*[float(arg) for arg in args[:4]], int(args[4]), int(args[5]), order == 'serpentine')
+                if order == 'nearest':
+                    points = orderPoints(points, order)
+            else:
+                if len(args) not in (1, 2) or (len(args) == 2 and args[1] not in ('nearest', 'none')):
+                    raise ScriptError(lineNumber, 'Syntax: pointspec [file] [nearest|none]')
+                points = orderPoints(loadPoints(args[0]), args[1] if len(args) == 2 else 'nearest')
+            return PositionStep(lineNumber, handler.codec, points)
+        except (OSError, ValueError, struct.error) as e:
+            raise ScriptError(lineNumber, 'Invalid positions: {}'.format(e))
+
+    def compileCommand(self, line, lineNumber, cmdAlias, cmdArgs):
+        """Compiles a command line.
+
+        Args:
+            line (str): Script line.
+            lineNumber (int): Line number.
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdArgs (list): Command arguments.
+
+        Raises:
+            ScriptError: If the command is unknown or the arguments are invalid.
+
+        Returns:
+            CommandStep: Compiled command.
+        """
+        handler = self.nni.registry.get(cmdAlias)
+        if handler is None:
+            raise ScriptError(lineNumber, 'Unknown command "{}".'.format(cmdAlias))
+        if isinstance(handler, NormalCommand):
+            codec = handler.codec
+            self.checkArgs(lineNumber, cmdAlias, cmdArgs, codec.args, [])
+            # Lists are passed to array arguments, e.g. getSignals [0, 1, 30]
+            values = []
+            for arg, argType, value in zip(codec.args, codec.argTypes, cmdArgs):
+                items = parseList(value)
+                isArray = len(parseType(argType)[1]) > 0 and parseType(argType)[0] != 's'
+                if (items is not None) != isArray:
+                    raise ScriptError(lineNumber, 'Argument "{}" of "{}" {} a list.'.format(arg, cmdAlias, 'must be' if isArray else 'cannot be'))
+                values.append(value if items is None else items)
+            cmdArgs = values
+            try:
+                request = codec.encode(cmdArgs)
+            except (ValueError, TypeError, struct.error) as e:
+                raise ScriptError(lineNumber, 'Invalid arguments for "{}": {}'.format(cmdAlias, e))
+            return CommandStep(line, lineNumber, cmdAlias, cmdArgs, codec, request)
+        self.checkArgs(lineNumber, cmdAlias, cmdArgs, handler.args, handler.argTypes)
+        return CommandStep(line, lineNumber, cmdAlias, cmdArgs)
+
+    def compileRecord(self, line, lineNumber, args):
+        """Compiles a command whose response is recorded. Syntax:
+
+            record [command] [arguments ...]                        (all numeric fields)
+            record [command] [arguments ...] "field1" "field2" ...  (selected fields)
+
+        Args:
+            line (str): Script line.
+            lineNumber (int): Line number.
+            args (list): Tokens following the keyword.
+
+        Raises:
+            ScriptError: If the command is not a normal command with response or a field is unknown.
+
+        Returns:
+            RecordStep: Compiled command.
+        """
+        if len(args) == 0:
+            raise ScriptError(lineNumber, 'Syntax: record [command] [arguments] ["field" ...]')
+        handler = self.nni.registry.get(args[0])
+        if not isinstance(handler, NormalCommand) or len(handler.codec.respKeys) == 0:
+            raise ScriptError(lineNumber, '"{}" is not a normal command with response.'.format(args[0]))
+        fields = [arg[1:-1] for arg in args[1:] if arg.startswith('"')]
+        for field in fields:
+            if field not in handler.codec.respKeys:
+                raise ScriptError(lineNumber, 'Unknown field "{}". Fields: {}'.format(field, ', '.join(handler.codec.respKeys)))
+        cmdArgs = [arg for arg in args[1:] if not arg.startswith('"')]
+        step = self.compileCommand(line, lineNumber, args[0], cmdArgs)
+        return RecordStep(line, lineNumber, ' '.join(args), step.codec, step.request, fields if len(fields) > 0 else None)
+
+    def compileWaitUntil(self, line, lineNumber, args):
+        """Compiles a condition wait. Syntax:
+
+            waituntil [getter] [operator] [value] [timeout (s)]
+            waituntil [getter] "field" [operator] [value] [timeout (s)]
+
+        The getter must be a normal command without arguments. The field can be omitted if
+        the getter returns a single value. Operators: <, <=, >, >=, ==, !=
+
+        Args:
+            line (str): Script line.
+            lineNumber (int): Line number.
+            args (list): Tokens following the keyword.
+
+        Raises:
+            ScriptError: If the condition is invalid.
+
+        Returns:
+            WaitUntilStep: Compiled wait.
+        """
+        syntax = 'Syntax: waituntil [getter] ["field"] [{}] [value] [timeout (s)]'.format('|'.join(COMPARISONS))
+        if len(args) < 3:
+            raise ScriptError(lineNumber, syntax)
+        handler = self.nni.registry.get(args[0])
+        if not isinstance(handler, NormalCommand) or len(handler.args) != 0:
+            raise ScriptError(lineNumber, '"{}" is not a normal command without arguments.'.format(args[0]))
+        codec = handler.codec
+        if args[1].startswith('"'):
+            field = args[1][1:-1]
+            args = args[2:]
+        elif len(codec.respKeys) == 1:
+            field = codec.respKeys[0]
+            args = args[1:]
+        else:
+            raise ScriptError(lineNumber, '"{}" returns several values, select one: {}'.format(handler.alias, ', '.join(codec.respKeys)))
+        respType = self.nni.commandList[handler.alias]['respTypes'].get(field)
+        if respType is None or (respType not in INTEGER_TYPES and respType not in FLOAT_TYPES):
+            raise ScriptError(lineNumber, '"{}" is not a single number returned by "{}".'.format(field, handler.alias))
+        if len(args) not in (2, 3) or args[0] not in COMPARISONS:
+            raise ScriptError(lineNumber, syntax)
+        try:
+            threshold = float(args[1])
+            timeout = float(args[2]) if len(args) == 3 else None
+        except ValueError:
+            raise ScriptError(lineNumber, syntax)
+        return WaitUntilStep(line, lineNumber, codec, codec.encode([]), field, COMPARISONS[args[0]], threshold, timeout)
+
+    def checkArgs(self, lineNumber, cmdAlias, cmdArgs, args, argTypes):
+        """Checks the number and the types of the arguments of a command.
+
+        Args:
+            lineNumber (int): Line number.
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdArgs (list): Command arguments.
+            args (list): Names of the arguments.
+            argTypes (list): Types of the arguments according to the module struct().
+
+        Raises:
+            ScriptError: If the arguments are invalid.
+        """
+        if len(cmdArgs) != len(args):
+            syntax = ' '.join([cmdAlias] + ['[{}]'.format(arg) for arg in args])
+            raise ScriptError(lineNumber, 'Wrong number of arguments. Syntax: {}'.format(syntax))
+        for arg, argType, value in zip(args, argTypes, cmdArgs):
+            try:
+                if argType in INTEGER_TYPES or argType in FLOAT_TYPES:
+                    float(value)
+            except ValueError:
+                raise ScriptError(lineNumber, 'Invalid value "{}" for argument "{}".'.format(value, arg))
+
+    def groupBatches(self, steps):
+        """Combines consecutive normal commands into pipelined batches.
+
+        Args:
+            steps (list): Compiled steps.
+
+        Returns:
+            list: Compiled steps.
+        """
+        grouped = []
+        batch = []
+        for step in steps:
+            if isinstance(step, CommandStep) and step.codec is not None:
+                batch.append(step)
+                continue
+            grouped.extend(self.flushBatch(batch))
+            batch = []
+            if isinstance(step, ParallelStep):
+                step.branches = [(lineNumber, self.groupBatches(steps)) for lineNumber, steps in step.branches]
+                step.body = step.branches[-1][1]
+            elif isinstance(step, BlockStep):
+                step.body = self.groupBatches(step.body)
+            grouped.append(step)
+        grouped.extend(self.flushBatch(batch))
+        return grouped
+
+    def flushBatch(self, batch):
+        if len(batch) > 1:
+            return [BatchStep(batch)]
+        return batch
+
+class ScriptRunner():
+    """Executes a compiled script plan.
+    """
+    def __init__(self, nni, log=None, isCancelled=None, recorder=None):
+        """
+        Args:
+            nni (NanonisInterface): Interface used to execute the commands.
+            log (callable, optional): Function log(msgType, message) for requests and responses. Defaults to None.
+            isCancelled (callable, optional): Function returning True if the execution is to be stopped. Defaults to None.
+            recorder (Recorder, optional): Recorder of the values of "record" lines. Defaults to None (values are not recorded).
+        """
+        self.nni = nni
+        self.recorder = recorder
+        self.logFunction = log
+        self.isCancelled = isCancelled if isCancelled is not None else lambda: False
+        self.errors = 0
+
+    def log(self, msgType, message):
+        if self.logFunction is not None:
+            self.logFunction(msgType, message)
+
+    def logResponse(self, err, resp):
+        if err:
+            self.errors += 1
+        if len(resp) > 0:
+            self.log('Response', str(resp))
+
+    def run(self, plan):
+        """Executes a plan.
+
+        Args:
+            plan (ScriptPlan): Compiled script.
+        """
+        self.runSteps(plan.steps)
+
+    def runBranch(self, steps):
+        """Executes the steps of a parallel branch with a separate runner.
+
+        Args:
+            steps (list): Compiled steps.
+
+        Returns:
+            int: Number of failed commands.
+        """
+        runner = ScriptRunner(self.nni, self.logFunction, self.isCancelled, self.recorder)
+        runner.runSteps(steps)
+        return runner.errors
+
+    def runSteps(self, steps):
+        """Executes steps one after the other until the execution is cancelled.
+
+        Args:
+            steps (list): Compiled steps.
+        """
+        for step in steps:
+            if self.isCancelled():
+                return
+            step.execute(self)
@@ -1,40 +1,79 @@
 # Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
 
 from PySide6 import QtGui
-from PySide6.QtCore import Qt
+from PySide6.QtCore import QStringListModel, Qt, QTimer
 from PySide6.QtGui import QTextCursor
 from PySide6.QtWidgets import QCompleter, QPlainTextEdit
 
-from PyNanonis import NanonisInterface
+from AunisScript import KEYWORDS
 import config as cfg
 
+class PrefixTrie():
+    """Prefix tree of words. Every node stores the sorted list of all words starting
+    with its prefix, so that a lookup only depends on the length of the prefix.
+    """
+    def __init__(self, words=()):
+        # Node: (children by character, words with this prefix)
+        self.root = ({}, [])
+        for word in sorted(set(words)):
+            self.insert(word)
+
+    def insert(self, word):
+        node = self.root
+        node[1].append(word)
+        for char in word:
+            node = node[0].setdefault(char, ({}, []))
+            node[1].append(word)
+
+    def complete(self, prefix):
+        """Returns all words starting with the prefix.
+
+        Args:
+            prefix (str): Prefix.
+
+        Returns:
+            list: Words in alphabetical order.
+        """
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1]
+
 class TextEditAutoComplete(QPlainTextEdit):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.nni = NanonisInterface()
-        completer = QCompleter(self.getCmdList())
+        self.trie = PrefixTrie(KEYWORDS)
+        self.model = QStringListModel(self)
+        completer = QCompleter(self.model, self)
         completer.activated.connect(self.insert_completion)
         completer.setWidget(self)
         completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
         completer.setCaseSensitivity(Qt.CaseSensitivity.CaseSensitive)
         self.completer = completer
-        self.textChanged.connect(self.complete)
-
-    def getCmdList(self):
-        cmds = ['repeat', 'end']
-        self.commandList = self.nni.commandList
-        self.specialCommandList = self.nni.loadCommandList(cfg.JSON_SPECIALCMD)
-        self.externalInterfacesCommandLists = self.nni.loadExternalInterfaceCommandLists(cfg.FOLDER_EXTCMD)
-        for cmd in self.commandList.keys():
-            cmds.append(cmd)
-        for cmd in self.specialCommandList.keys():
-            cmds.append(cmd)
-        if len(self.externalInterfacesCommandLists) > 0:
-            for interfaceCmds in self.externalInterfacesCommandLists:
-                for cmd in interfaceCmds.keys():
-                    if cmd != 'Interface':           
-                        cmds.append(cmd)
-        return cmds
+
+        # Completion is only started when a single character was typed and the typing pauses
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(cfg.AUTOCOMPLETE_DELAY)
+        self.timer.timeout.connect(self.complete)
+        self.document().contentsChange.connect(self.contentsChanged)
+
+    def setCommandRegistry(self, registry):
+        """Sets the commands offered for completion.
+
+        Args:
+            registry (CommandRegistry): Registry of all commands.
+        """
+        self.trie = PrefixTrie(list(KEYWORDS) + registry.aliases())
+
+    def contentsChanged(self, position, charsRemoved, charsAdded):
+        if charsAdded == 1 and charsRemoved == 0:
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self.completer.popup().hide()
 
     def insert_completion(self, completion):
         tc = self.textCursor()
@@ -52,6 +91,11 @@ class TextEditAutoComplete(QPlainTextEdit):
 
     def complete(self):
         prefix = self.text_under_cursor
+        words = self.trie.complete(prefix) if len(prefix) > 0 else []
+        if len(words) == 0 or words == [prefix]:
+            self.completer.popup().hide()
+            return
+        self.model.setStringList(words)
         self.completer.setCompletionPrefix(prefix)
         popup = self.completer.popup()
         cr = self.cursorRect()
@@ -73,4 +117,4 @@ class TextEditAutoComplete(QPlainTextEdit):
         ]:
             event.ignore()
             return
-        super().keyPressEvent(event)
\ No newline at end of file
+        super().keyPressEvent(event)
@@ -0,0 +1,121 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import logging
+import os
+import pickle
+import threading
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+# Increase if the structure of the cached definitions changes
+CACHE_VERSION = 1
+
+def commandFiles():
+    """Returns the paths of all JSON files defining commands.
+
+    Returns:
+        list: Paths (normal commands, special commands, external interfaces).
+    """
+    files = [cfg.JSON_CMD, cfg.JSON_SPECIALCMD]
+    for filename in sorted(os.listdir(cfg.FOLDER_EXTCMD)):
+        files.append(os.path.join(cfg.FOLDER_EXTCMD, filename))
+    return files
+
+def fingerprint(files):
+    """Returns the modification time and size of the files.
+
+    Args:
+        files (list): Paths.
+
+    Returns:
+        tuple: Key identifying the state of the files.
+    """
+    key = []
+    for filename in files:
+        stat = os.stat(filename)
+        key.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+def loadCache(filename, key):
+    """Reads the cached command definitions.
+
+    Args:
+        filename (str): Cache file.
+        key (tuple): Fingerprint of the JSON files.
+
+    Returns:
+        tuple: Command list, special command list, external interface command lists. None if the cache is missing or outdated.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION or cache.get('key') != key:
+        return None
+    return cache['definitions']
+
+def saveCache(filename, key, definitions):
+    """Writes the command definitions to the cache. The file is replaced atomically.
+    Errors are ignored, the cache is only an optimization.
+
+    Args:
+        filename (str): Cache file.
+        key (tuple): Fingerprint of the JSON files.
+        definitions (tuple): Command list, special command list, external interface command lists.
+    """
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        temp = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(temp, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'key': key, 'definitions': definitions}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, filename)
+    except OSError as e:
+        logger.debug('Could not write command cache: %s', e)
+
+class CommandWatcher(threading.Thread):
+    """Polls the JSON files of the commands and reloads them into the interface if they change.
+    If the new definitions are invalid, the interface keeps the old ones.
+    """
+    def __init__(self, nni, onReload=None, onError=None, interval=cfg.WATCH_INTERVAL):
+        """
+        Args:
+            nni (NanonisInterface): Interface whose commands are reloaded.
+            onReload (callable, optional): Called with the new registry after a reload. Defaults to None.
+            onError (callable, optional): Called with the error message if a reload fails. Defaults to None.
+            interval (float, optional): Polling interval (s).
+        """
+        super(CommandWatcher, self).__init__(daemon=True)
+        self.nni = nni
+        self.onReload = onReload
+        self.onError = onError
+        self.interval = interval
+        self.stopEvent = threading.Event()
+
+    def run(self):
+        key = self.currentKey()
+        while not self.stopEvent.wait(self.interval):
+            newKey = self.currentKey()
+            if newKey is None or newKey == key:
+                continue
+            key = newKey
+            try:
+                self.nni.reloadCommands()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if self.onError is not None:
+                    self.onError(str(e))
+                continue
+            if self.onReload is not None:
+                self.onReload(self.nni.registry)
+
+    def currentKey(self):
+        try:
+            return fingerprint(commandFiles())
+        except OSError:
+            # A file is being replaced, try again with the next poll
+            return None
+
+    def stop(self):
+        self.stopEvent.set()
@@ -0,0 +1,179 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import config as cfg
+from PyNanonis import NanonisInterface
+
+# Priority lanes of the executor (lower value is served first)
+INTERACTIVE = 0
+SCRIPT = 1
+TELEMETRY = 2
+
+# Commands that wait on the Nanonis side (e.g. spectra, moves) are never pipelined with other requests
+BLOCKING_COMMANDS = frozenset(cmdName.encode() for cmdName in cfg.BLOCKING_COMMANDS)
+
+class CommandExecutor(threading.Thread):
+    """Single thread that owns the connection to the Nanonis software.
+
+    All request/response exchanges are submitted to a priority queue and executed one
+    after the other, so that requests of different callers (GUI, script, telemetry) can
+    never be interleaved. Within a lane the order of submission is kept. Every caller
+    receives a concurrent.futures.Future with the result.
+    """
+    STOP = 99
+
+    def __init__(self, nni):
+        """
+        Args:
+            nni (NanonisInterface): Interface owned by the executor.
+        """
+        super(CommandExecutor, self).__init__(daemon=True)
+        self.nni = nni
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.stopped = False
+        self.start()
+
+    def submit(self, priority, fn, *args):
+        """Schedules a call in the executor thread.
+
+        Args:
+            priority (int): Lane (INTERACTIVE, SCRIPT or TELEMETRY).
+            fn (callable): Function to call, e.g. nni.sendCommand.
+            *args: Arguments of the function.
+
+        Raises:
+            RuntimeError: If the executor is stopped.
+
+        Returns:
+            Future: Result of the call.
+        """
+        if self.stopped:
+            raise RuntimeError('Command executor is stopped.')
+        future = Future()
+        self.queue.put((priority, next(self.counter), fn, args, future))
+        return future
+
+    def run(self):
+        while True:
+            priority, _, fn, args, future = self.queue.get()
+            if priority == self.STOP:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stop(self):
+        """Executes all pending calls and stops the thread.
+        """
+        if not self.stopped:
+            self.stopped = True
+            self.queue.put((self.STOP, next(self.counter), None, (), None))
+            self.join()
+
+class ExecutorClient():
+    """View of the NanonisInterface whose requests are executed by a CommandExecutor in the given lane.
+
+    Normal commands are encoded in the calling thread and only the exchange with the
+    Nanonis software is done by the executor. Special commands run in the calling thread and
+    their inner commands are submitted in the same lane. External commands use their own
+    connections and are executed directly. All other attributes are taken from the interface.
+    """
+    def __init__(self, executor, priority):
+        """
+        Args:
+            executor (CommandExecutor): Executor owning the connection.
+            priority (int): Lane (INTERACTIVE, SCRIPT or TELEMETRY).
+        """
+        self.executor = executor
+        self.priority = priority
+        self.interface = executor.nni
+        self.worker = None
+
+    def __getattr__(self, name):
+        return getattr(self.interface, name)
+
+    def connect(self, ip, port):
+        return self.executor.submit(self.priority, self.interface.connect, ip, port).result()
+
+    def disconnect(self):
+        return self.executor.submit(self.priority, self.interface.disconnect).result()
+
+    def command(self, cmdAlias, cmdArgs):
+        """Executes a command, see NanonisInterface.command().
+        """
+        handler = self.interface.registry.get(cmdAlias)
+        if handler is None:
+            return False, ''
+        return handler.execute(self, cmdArgs)
+
+    def runAsync(self, fn, *args):
+        """Calls a function in a background thread of the client, e.g. to execute commands without
+        blocking the user interface. The calls are executed one after the other in the order of submission.
+
+        Args:
+            fn (callable): Function to call, e.g. client.command.
+            *args: Arguments of the function.
+
+        Returns:
+            Future: Result of the call.
+        """
+        if self.worker is None:
+            self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ExecutorClient')
+        return self.worker.submit(fn, *args)
+
+    def commandAsync(self, cmdAlias, cmdArgs):
+        """Executes a command in a background thread, see command() and runAsync().
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            Future: Error (True/False) and decoded response message.
+        """
+        return self.runAsync(self.command, cmdAlias, cmdArgs)
+
+    def sendCommand(self, codec, request, encodeTime=0.0):
+        """Sends an already encoded request message, see NanonisInterface.sendCommand().
+        """
+        return self.executor.submit(self.priority, self.interface.sendCommand, codec, request, encodeTime).result()
+
+    def sendPipelined(self, requests):
+        """Sends several already encoded request messages, see NanonisInterface.sendPipelined().
+        Every chunk of up to config.PIPELINE_DEPTH requests is submitted separately, so that
+        commands of a higher lane are executed between the chunks. Commands listed in
+        config.BLOCKING_COMMANDS form a chunk of their own, so that a higher lane waits
+        for at most one of them.
+        """
+        futures = []
+        chunk = []
+        for request in requests:
+            if request[0].cmdName in BLOCKING_COMMANDS:
+                if len(chunk) > 0:
+                    futures.append(self.executor.submit(self.priority, self.interface.sendPipelined, chunk))
+                    chunk = []
+                futures.append(self.executor.submit(self.priority, self.interface.sendPipelined, [request]))
+                continue
+            chunk.append(request)
+            if len(chunk) == cfg.PIPELINE_DEPTH:
+                futures.append(self.executor.submit(self.priority, self.interface.sendPipelined, chunk))
+                chunk = []
+        if len(chunk) > 0:
+            futures.append(self.executor.submit(self.priority, self.interface.sendPipelined, chunk))
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def commandBatch(self, cmds):
+        """Executes several commands, see NanonisInterface.commandBatch().
+        """
+        return NanonisInterface.commandBatch(self, cmds)
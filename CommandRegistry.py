@@ -0,0 +1,149 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import time
+
+from NanonisCodec import CommandCodec
+from SpecialCommands import SPECIAL_COMMANDS
+
+class CommandConflictError(ValueError):
+    """An alias is defined more than once, e.g. as normal and as external command.
+    """
+
+class NormalCommand():
+    """Command of the Nanonis TCP interface.
+    """
+    kind = 'normal'
+
+    def __init__(self, codec):
+        """
+        Args:
+            codec (CommandCodec): Codec of the command.
+        """
+        self.codec = codec
+        self.alias = codec.alias
+        self.args = codec.args
+        self.argTypes = codec.argTypes
+
+    def execute(self, nni, cmdArgs):
+        """Executes the command if the number of arguments is correct.
+
+        Args:
+            nni (NanonisInterface): Interface used to execute the command.
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        if len(cmdArgs) != len(self.args):
+            return False, ''
+        start = time.perf_counter()
+        request = self.codec.encode(cmdArgs)
+        return nni.sendCommand(self.codec, request, time.perf_counter() - start)
+
+class ExternalCommand():
+    """Command of an external TCP interface.
+    """
+    kind = 'external'
+
+    def __init__(self, cmdAlias, interfaceCmds):
+        """
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            interfaceCmds (dict): Dictionary containing commands of external interface.
+        """
+        self.alias = cmdAlias
+        self.interfaceCmds = interfaceCmds
+        self.interface = interfaceCmds['Interface']
+        self.args = tuple(interfaceCmds[cmdAlias]['args'])
+        self.argTypes = tuple(interfaceCmds[cmdAlias]['argTypes'][arg] for arg in self.args)
+
+    def execute(self, nni, cmdArgs):
+        """Executes the command.
+
+        Args:
+            nni (NanonisInterface): Interface used to execute the command.
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            bool, str: Error (True/False), Response message.
+        """
+        return nni.externalCommand(self.interfaceCmds, self.alias, cmdArgs)
+
+class CommandRegistry():
+    """Maps every alias (normal, special and external commands) to the object handling it.
+    """
+    def __init__(self):
+        self.handlers = {}
+        self.sources = {}
+
+    def register(self, cmdAlias, handler, source):
+        """Registers the handler of a command.
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            handler (NormalCommand, SpecialCommand or ExternalCommand): Handler of the command.
+            source (str): Origin of the definition (used for error messages).
+
+        Raises:
+            CommandConflictError: If the alias is already registered.
+        """
+        if cmdAlias in self.handlers:
+            raise CommandConflictError('Command "{}" of {} is already defined by {}.'.format(cmdAlias, source, self.sources[cmdAlias]))
+        self.handlers[cmdAlias] = handler
+        self.sources[cmdAlias] = source
+
+    def get(self, cmdAlias):
+        """Returns the handler of a command.
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+
+        Returns:
+            Handler of the command. None if the command is unknown.
+        """
+        return self.handlers.get(cmdAlias)
+
+    def __contains__(self, cmdAlias):
+        return cmdAlias in self.handlers
+
+    def aliases(self):
+        """Returns the aliases of all commands.
+
+        Returns:
+            list: Aliases.
+        """
+        return list(self.handlers.keys())
+
+def buildRegistry(commandList, specialCommandList, externalInterfacesCommandLists, commandCodecs=None):
+    """Builds the registry of all commands.
+
+    Args:
+        commandList (dict): Normal commands.
+        specialCommandList (dict): Special commands.
+        externalInterfacesCommandLists (list): Commands of the external interfaces.
+        commandCodecs (dict, optional): Already compiled codecs of the normal commands. Defaults to None.
+
+    Raises:
+        CommandConflictError: If an alias is defined more than once.
+        ValueError: If a special command has no implementation.
+
+    Returns:
+        CommandRegistry: Registry.
+    """
+    registry = CommandRegistry()
+    for cmdAlias, cmdDef in commandList.items():
+        if commandCodecs is not None:
+            codec = commandCodecs[cmdAlias]
+        else:
+            codec = CommandCodec(cmdAlias, cmdDef)
+        registry.register(cmdAlias, NormalCommand(codec), 'the normal commands')
+    for cmdAlias, cmdDef in specialCommandList.items():
+        if cmdAlias not in SPECIAL_COMMANDS:
+            raise ValueError('Special command "{}" has no implementation.'.format(cmdAlias))
+        registry.register(cmdAlias, SPECIAL_COMMANDS[cmdAlias](cmdAlias, cmdDef), 'the special commands')
+    for interfaceCmds in externalInterfacesCommandLists:
+        source = 'interface "{}"'.format(interfaceCmds['Interface']['Name'])
+        for cmdAlias in interfaceCmds:
+            if cmdAlias != 'Interface':
+                registry.register(cmdAlias, ExternalCommand(cmdAlias, interfaceCmds), source)
+    return registry
@@ -0,0 +1,303 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import select
+import socket
+import struct
+import threading
+
+FRAMING_NONE = 'none'
+FRAMING_DELIMITER = 'delimiter'
+FRAMING_LENGTH = 'length'
+
+LEGACY_RECV_SIZE = 1024
+
+class Framing():
+    """Framing of the messages exchanged with an external TCP interface, as declared by
+    the entry "Framing" of the "Interface" in the JSON file:
+
+    - {"Type": "delimiter", "Delimiter": "\\n"}: Request and response are terminated by the delimiter.
+    - {"Type": "length", "Format": ">I"}: Request and response are prefixed by their size in bytes.
+    - No entry: One request per connection, the response is read with a single recv().
+    """
+    def __init__(self, interface):
+        """Reads the framing from the parameters of an external interface.
+
+        Args:
+            interface (dict): TCP connection parameters of the external interface.
+
+        Raises:
+            ValueError: If the framing type is unknown.
+        """
+        framing = interface.get('Framing', {'Type': FRAMING_NONE})
+        self.type = framing['Type']
+        self.delimiter = framing.get('Delimiter', '\n').encode()
+        self.lengthStruct = struct.Struct(framing.get('Format', '>I'))
+        if self.type not in (FRAMING_NONE, FRAMING_DELIMITER, FRAMING_LENGTH):
+            raise ValueError('Unknown framing "{}" of interface "{}".'.format(self.type, interface['Name']))
+        # Connections can only be reused if the end of a response is known
+        self.keepAlive = interface.get('KeepAlive', self.type != FRAMING_NONE) and self.type != FRAMING_NONE
+
+    def frame(self, request):
+        """Frames a request message.
+
+        Args:
+            request (bytes): Request message.
+
+        Returns:
+            list: Buffers to be sent.
+        """
+        if self.type == FRAMING_DELIMITER:
+            return [request, self.delimiter]
+        if self.type == FRAMING_LENGTH:
+            return [self.lengthStruct.pack(len(request)), request]
+        return [request]
+
+class ExternalConnection():
+    """Persistent connection to an external TCP interface.
+
+    The connection is kept open between commands (keep-alive) and is reestablished
+    automatically if it was closed by the other side. Requests are serialized by a lock.
+    """
+    def __init__(self, interface):
+        """
+        Args:
+            interface (dict): TCP connection parameters of the external interface.
+        """
+        self.address = (interface['IP-Adress'], interface['Port'])
+        self.timeout = interface.get('Timeout (s)', None)
+        self.framing = Framing(interface)
+        self.sock = None
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+
+    def open(self):
+        """Opens the connection.
+        """
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.buffer = bytearray()
+
+    def close(self):
+        """Closes the connection.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def isStale(self):
+        """Checks if an idle connection was closed by the other side or has unexpected data.
+
+        Returns:
+            bool: True if the connection can not be used anymore.
+        """
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        return len(readable) > 0
+
+    def receive(self):
+        """Reads one framed response message.
+
+        Returns:
+            bytes: Response message without framing.
+        """
+        if self.framing.type == FRAMING_NONE:
+            return self.sock.recv(LEGACY_RECV_SIZE)
+        if self.framing.type == FRAMING_DELIMITER:
+            while True:
+                end = self.buffer.find(self.framing.delimiter)
+                if end >= 0:
+                    resp = bytes(self.buffer[:end])
+                    del self.buffer[:end+len(self.framing.delimiter)]
+                    return resp
+                self.receiveMore()
+        lengthSize = self.framing.lengthStruct.size
+        while len(self.buffer) < lengthSize:
+            self.receiveMore()
+        size = lengthSize + self.framing.lengthStruct.unpack_from(self.buffer)[0]
+        while len(self.buffer) < size:
+            self.receiveMore()
+        resp = bytes(self.buffer[lengthSize:size])
+        del self.buffer[:size]
+        return resp
+
+    def receiveMore(self):
+        """Appends received data to the buffer.
+        """
+        data = self.sock.recv(65536)
+        if len(data) == 0:
+            raise ConnectionError('Connection closed by external interface.')
+        self.buffer += data
+
+    def request(self, request):
+        """Sends a request message and reads the response.
+        A stale or broken pooled connection is reestablished once before the request is sent.
+        A new connection is not retried, i.e. if connecting fails, the error is raised.
+        If receiving fails, the request is not repeated, since it may have been executed.
+
+        Args:
+            request (bytes): Request message.
+
+        Returns:
+            bytes: Response message.
+        """
+        with self.lock:
+            if self.sock is not None and self.isStale():
+                self.close()
+            reused = self.sock is not None
+            if not reused:
+                self.open()
+            try:
+                self.sock.sendall(b''.join(self.framing.frame(request)))
+            except OSError:
+                self.close()
+                if not reused:
+                    raise
+                self.open()
+                self.sock.sendall(b''.join(self.framing.frame(request)))
+            try:
+                return self.receive()
+            except OSError:
+                self.close()
+                raise
+            finally:
+                if not self.framing.keepAlive:
+                    self.close()
+
+class ExternalConnectionPool():
+    """Pool of connections to the external TCP interfaces, keyed on IP address and port.
+    """
+    def __init__(self):
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def get(self, interface):
+        """Returns the connection to an external interface. The connection is created on first use.
+
+        Args:
+            interface (dict): TCP connection parameters of the external interface.
+
+        Returns:
+            ExternalConnection: Connection to the interface.
+        """
+        key = (interface['IP-Adress'], interface['Port'])
+        with self.lock:
+            if key not in self.connections:
+                self.connections[key] = ExternalConnection(interface)
+            return self.connections[key]
+
+    def closeAll(self):
+        """Closes all connections.
+        """
+        with self.lock:
+            for connection in self.connections.values():
+                with connection.lock:
+                    connection.close()
+
+class AsyncExternalConnection():
+    """Persistent connection to an external TCP interface based on asyncio streams.
+    See ExternalConnection. asyncio is imported on first use, so that it is not
+    loaded together with the synchronous interface.
+    """
+    def __init__(self, interface):
+        """
+        Args:
+            interface (dict): TCP connection parameters of the external interface.
+        """
+        import asyncio
+        self.address = (interface['IP-Adress'], interface['Port'])
+        self.framing = Framing(interface)
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def open(self):
+        """Opens the connection.
+        """
+        import asyncio
+        self.reader, self.writer = await asyncio.open_connection(*self.address)
+        sock = self.writer.get_extra_info('socket')
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    def close(self):
+        """Closes the connection.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = None
+            self.writer = None
+
+    async def receive(self):
+        """Reads one framed response message.
+
+        Returns:
+            bytes: Response message without framing.
+        """
+        if self.framing.type == FRAMING_NONE:
+            return await self.reader.read(LEGACY_RECV_SIZE)
+        if self.framing.type == FRAMING_DELIMITER:
+            resp = await self.reader.readuntil(self.framing.delimiter)
+            return resp[:-len(self.framing.delimiter)]
+        prefix = await self.reader.readexactly(self.framing.lengthStruct.size)
+        return await self.reader.readexactly(self.framing.lengthStruct.unpack(prefix)[0])
+
+    async def request(self, request):
+        """Sends a request message and reads the response. See ExternalConnection.request().
+
+        Args:
+            request (bytes): Request message.
+
+        Returns:
+            bytes: Response message.
+        """
+        import asyncio
+        async with self.lock:
+            if self.writer is not None and (self.reader.at_eof() or self.writer.is_closing()):
+                self.close()
+            reused = self.writer is not None
+            if not reused:
+                await self.open()
+            self.writer.writelines(self.framing.frame(request))
+            try:
+                await self.writer.drain()
+            except OSError:
+                self.close()
+                if not reused:
+                    raise
+                await self.open()
+                self.writer.writelines(self.framing.frame(request))
+                await self.writer.drain()
+            try:
+                return await self.receive()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+                self.close()
+                raise ConnectionError('Connection to external interface lost.')
+            finally:
+                if not self.framing.keepAlive:
+                    self.close()
+
+class AsyncExternalConnectionPool():
+    """Pool of asyncio connections to the external TCP interfaces, keyed on IP address and port.
+    """
+    def __init__(self):
+        self.connections = {}
+
+    def get(self, interface):
+        """Returns the connection to an external interface. The connection is created on first use.
+
+        Args:
+            interface (dict): TCP connection parameters of the external interface.
+
+        Returns:
+            AsyncExternalConnection: Connection to the interface.
+        """
+        key = (interface['IP-Adress'], interface['Port'])
+        if key not in self.connections:
+            self.connections[key] = AsyncExternalConnection(interface)
+        return self.connections[key]
+
+    def closeAll(self):
+        """Closes all connections.
+        """
+        for connection in self.connections.values():
+            connection.close()
@@ -0,0 +1,152 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import numpy as np
+
+import config as cfg
+
+def gridPoints(x0, y0, x1, y1, nx, ny, serpentine=True):
+    """Returns the positions of a rectangular grid, row by row.
+
+    Args:
+        x0 (float): X of the first corner (m).
+        y0 (float): Y of the first corner (m).
+        x1 (float): X of the opposite corner (m).
+        y1 (float): Y of the opposite corner (m).
+        nx (int): Number of points per row.
+        ny (int): Number of rows.
+        serpentine (bool, optional): Every second row is measured backwards, so that the tip never jumps back to the start of a row. Defaults to True.
+
+    Raises:
+        ValueError: If the number of points is invalid.
+
+    Returns:
+        numpy.ndarray: Positions (n x 2).
+    """
+    if nx < 1 or ny < 1:
+        raise ValueError('Invalid number of points {} x {}.'.format(nx, ny))
+    xs = np.linspace(x0, x1, nx)
+    points = []
+    for row, y in enumerate(np.linspace(y0, y1, ny)):
+        for x in (xs[::-1] if serpentine and row % 2 == 1 else xs):
+            points.append((x, y))
+    return np.array(points)
+
+def loadPoints(filename):
+    """Reads positions from a text file. Each line contains X and Y (m), separated by whitespace or a comma.
+    Empty lines and lines starting with # are ignored.
+
+    Args:
+        filename (str): Point file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a line is invalid or the file contains no positions.
+
+    Returns:
+        numpy.ndarray: Positions (n x 2).
+    """
+    points = []
+    with open(filename, 'r') as f:
+        for lineNumber, line in enumerate(f, 1):
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            values = line.replace(',', ' ').split()
+            if len(values) != 2:
+                raise ValueError('Line {} of "{}" does not contain X and Y.'.format(lineNumber, filename))
+            points.append((float(values[0]), float(values[1])))
+    if len(points) == 0:
+        raise ValueError('"{}" contains no positions.'.format(filename))
+    return np.array(points)
+
+def pathLength(points):
+    """Returns the total travel distance of the tip along the positions.
+
+    Args:
+        points (numpy.ndarray): Positions (n x 2) in the order of the measurement.
+
+    Returns:
+        float: Distance (m).
+    """
+    return float(np.sum(np.hypot(*np.diff(points, axis=0).T)))
+
+def nearestNeighbourOrder(points):
+    """Orders the positions by always moving to the closest position not measured yet, starting with the first one.
+
+    Args:
+        points (numpy.ndarray): Positions (n x 2).
+
+    Returns:
+        numpy.ndarray: Indexes of the positions in the order of the measurement.
+    """
+    n = len(points)
+    order = np.empty(n, dtype=int)
+    visited = np.zeros(n, dtype=bool)
+    current = 0
+    for k in range(n):
+        order[k] = current
+        visited[current] = True
+        if k == n - 1:
+            break
+        distances = np.hypot(*(points - points[current]).T)
+        distances[visited] = np.inf
+        current = int(np.argmin(distances))
+    return order
+
+def twoOptOrder(points, order, maxPasses=cfg.SPEC_TWO_OPT_PASSES):
+    """Shortens a path by reversing segments as long as this reduces the travel distance (2-opt).
+    The first position is kept. For each position, all reversals are evaluated at once with NumPy.
+
+    Args:
+        points (numpy.ndarray): Positions (n x 2).
+        order (numpy.ndarray): Indexes of the positions in the order of the measurement.
+        maxPasses (int, optional): Maximum number of passes over all positions.
+
+    Returns:
+        numpy.ndarray: Improved order.
+    """
+    order = np.array(order)
+    path = points[order]
+    n = len(path)
+    for _ in range(maxPasses):
+        improved = False
+        for i in range(n - 2):
+            # Reversing path[i+1:j+1] replaces the edges (i, i+1) and (j, j+1) by (i, j) and (i+1, j+1)
+            a, b = path[i], path[i + 1]
+            c = path[i + 2:]
+            d = np.append(path[i + 3:], [c[-1]], axis=0)
+            dcd = np.hypot(*(c - d).T)
+            dbd = np.hypot(*(d - b).T)
+            # The last position has no following edge
+            dbd[-1] = 0
+            dab = np.hypot(*(a - b))
+            gain = dab + dcd - np.hypot(*(c - a).T) - dbd
+            k = int(np.argmax(gain))
+            # Relative threshold, so that rounding errors do not cause endless reversals
+            if gain[k] > 1e-9 * dab:
+                j = i + 2 + k
+                path[i + 1:j + 1] = path[i + 1:j + 1][::-1].copy()
+                order[i + 1:j + 1] = order[i + 1:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order
+
+def orderPoints(points, method):
+    """Orders the positions to reduce the travel distance of the tip.
+
+    Args:
+        points (numpy.ndarray): Positions (n x 2).
+        method (str): "nearest" (nearest neighbour followed by 2-opt) or "none" (order of the points).
+
+    Raises:
+        ValueError: If the method is unknown.
+
+    Returns:
+        numpy.ndarray: Positions (n x 2) in the order of the measurement.
+    """
+    if method == 'none' or len(points) < 3:
+        return points
+    if method == 'nearest':
+        return points[twoOptOrder(points, nearestNeighbourOrder(points))]
+    raise ValueError('Unknown order "{}".'.format(method))
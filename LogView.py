@@ -0,0 +1,103 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+from collections import deque
+
+from PySide6 import QtCore
+
+import config as cfg
+
+class LogModel(QtCore.QAbstractListModel):
+    """List model of the log messages with a fixed capacity (ring buffer).
+    The newest message is in the first row. If the capacity is reached, the oldest messages are dropped.
+    """
+    def __init__(self, capacity=cfg.LOG_VIEW_CAPACITY, parent=None):
+        """
+        Args:
+            capacity (int, optional): Maximum number of messages.
+            parent (QObject, optional): Parent object. Defaults to None.
+        """
+        super(LogModel, self).__init__(parent)
+        self.lines = deque(maxlen=capacity)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.lines)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if role == QtCore.Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self.lines[index.row()]
+        return None
+
+    def addLines(self, lines):
+        """Adds messages with a single update of the attached views.
+
+        Args:
+            lines (list): Messages, oldest first.
+        """
+        capacity = self.lines.maxlen
+        if len(lines) >= capacity:
+            self.beginResetModel()
+            self.lines.clear()
+            self.lines.extendleft(lines[-capacity:])
+            self.endResetModel()
+            return
+        overflow = len(self.lines) + len(lines) - capacity
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), len(self.lines) - overflow, len(self.lines) - 1)
+            for _ in range(overflow):
+                self.lines.pop()
+            self.endRemoveRows()
+        self.beginInsertRows(QtCore.QModelIndex(), 0, len(lines) - 1)
+        self.lines.extendleft(lines)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.lines.clear()
+        self.endResetModel()
+
+class LogView(QtCore.QObject):
+    """Connects the log model to a list view and a filter field.
+    Messages are collected and added to the model at a fixed refresh rate, so that
+    the cost of the GUI does not depend on the rate of the messages.
+    """
+    def __init__(self, listView, filterEdit=None, capacity=cfg.LOG_VIEW_CAPACITY, interval=cfg.LOG_VIEW_REFRESH_INTERVAL):
+        """
+        Args:
+            listView (QListView): View showing the messages.
+            filterEdit (QLineEdit, optional): Text field for filtering the messages. Defaults to None.
+            capacity (int, optional): Maximum number of messages.
+            interval (int, optional): Refresh interval (ms).
+        """
+        super(LogView, self).__init__(listView)
+        self.pending = []
+        self.model = LogModel(capacity, self)
+        self.proxy = QtCore.QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        listView.setModel(self.proxy)
+        listView.setUniformItemSizes(True)
+        if filterEdit is not None:
+            filterEdit.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def append(self, line):
+        """Adds a message. It is shown with the next refresh.
+
+        Args:
+            line (str): Message.
+        """
+        self.pending.append(line)
+
+    def flush(self):
+        """Adds all pending messages to the model.
+        """
+        if len(self.pending) > 0:
+            lines = self.pending
+            self.pending = []
+            self.model.addLines(lines)
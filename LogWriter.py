@@ -0,0 +1,157 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+import config as cfg
+
+class LogWriter(threading.Thread):
+    """Writes the log messages in a background thread.
+
+    Messages are put into a queue and written in batches, which are flushed when
+    a number of lines has been collected or a time interval has elapsed. Every
+    message is written to a tab-separated text file (.log) and as JSON object
+    (.jsonl) with wall-clock and monotonic timestamp. If a file exceeds its maximum
+    size, it is rotated and the old file is compressed with gzip.
+    """
+    def __init__(self, directory, name='cmds', flushLines=cfg.LOG_FLUSH_LINES, flushInterval=cfg.LOG_FLUSH_INTERVAL,
+                 maxBytes=cfg.LOG_MAX_BYTES, backupCount=cfg.LOG_BACKUP_COUNT):
+        """
+        Args:
+            directory (str): Folder of the log files. Created with the first message.
+            name (str, optional): Name of the log files without extension. Defaults to 'cmds'.
+            flushLines (int, optional): Number of lines after which the batch is written.
+            flushInterval (float, optional): Maximum time (s) a message stays in the batch.
+            maxBytes (int, optional): Size (bytes) at which a log file is rotated. 0: Never.
+            backupCount (int, optional): Number of rotated files that are kept.
+        """
+        super(LogWriter, self).__init__(daemon=True)
+        self.directory = directory
+        self.name = name
+        self.flushLines = flushLines
+        self.flushInterval = flushInterval
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.queue = queue.SimpleQueue()
+        self.files = {}
+        self.monotonicStart = time.monotonic()
+        self.lastSecond = None
+        self.lastTimestamp = ''
+        self.start()
+
+    def write(self, msgType, message):
+        """Adds a message to the log. Does not block.
+
+        Args:
+            msgType (str): Request or Response
+            message (str): Message text.
+        """
+        self.queue.put((time.time(), time.monotonic(), msgType, message))
+
+    def close(self):
+        """Writes all pending messages and stops the thread.
+        """
+        if self.is_alive():
+            self.queue.put(None)
+            self.join()
+
+    def run(self):
+        batch = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                running = False
+            elif len(item) > 0:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flushInterval
+            if len(batch) > 0 and (not running or len(batch) >= self.flushLines or time.monotonic() >= deadline):
+                try:
+                    self.flush(batch)
+                except OSError:
+                    pass
+                batch = []
+                deadline = None
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def timestamp(self, t):
+        """Formats the wall-clock time. The string is only rebuilt once per second.
+        """
+        second = int(t)
+        if second != self.lastSecond:
+            self.lastSecond = second
+            self.lastTimestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        return self.lastTimestamp
+
+    def flush(self, batch):
+        """Writes a batch of messages to the log files.
+
+        Args:
+            batch (list): Messages (wall-clock time, monotonic time, type, text).
+        """
+        text = []
+        lines = []
+        for t, monotonic, msgType, message in batch:
+            text.append('{}\t{}\t{}\n'.format(self.timestamp(t), msgType, message))
+            lines.append(json.dumps({'time': t, 'monotonic': monotonic - self.monotonicStart,
+                                     'type': msgType, 'message': message}) + '\n')
+        self.append('log', ''.join(text))
+        self.append('jsonl', ''.join(lines))
+
+    def append(self, extension, data):
+        """Appends data to a log file and rotates it if it exceeds the maximum size.
+
+        Args:
+            extension (str): Extension of the log file.
+            data (str): Text.
+        """
+        f = self.files.get(extension)
+        if f is None:
+            os.makedirs(self.directory, exist_ok=True)
+            f = self.files[extension] = open(self.filename(extension), 'a', encoding='utf-8')
+        f.write(data)
+        f.flush()
+        if self.maxBytes > 0 and f.tell() >= self.maxBytes:
+            f.close()
+            del self.files[extension]
+            self.rotate(extension)
+
+    def filename(self, extension, index=0):
+        name = os.path.join(self.directory, '{}.{}'.format(self.name, extension))
+        if index > 0:
+            name += '.{}.gz'.format(index)
+        return name
+
+    def rotate(self, extension):
+        """Renames file.N.gz to file.N+1.gz and compresses the current file into file.1.gz.
+
+        Args:
+            extension (str): Extension of the log file.
+        """
+        if self.backupCount <= 0:
+            os.remove(self.filename(extension))
+            return
+        oldest = self.filename(extension, self.backupCount)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(self.backupCount - 1, 0, -1):
+            name = self.filename(extension, index)
+            if os.path.exists(name):
+                os.replace(name, self.filename(extension, index + 1))
+        current = self.filename(extension)
+        with open(current, 'rb') as src, gzip.open(self.filename(extension, 1), 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(current)
@@ -0,0 +1,216 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import json
+import math
+import threading
+import time
+
+class LatencyHistogram():
+    """Histogram of durations with logarithmically spaced buckets.
+    Recording a value is O(1) and the memory is fixed, percentiles are
+    accurate to the width of a bucket (about 12% for 20 buckets per decade).
+    """
+    def __init__(self, minValue=1e-6, maxValue=1e4, bucketsPerDecade=20):
+        """
+        Args:
+            minValue (float, optional): Lower limit of the first bucket (s). Defaults to 1e-6.
+            maxValue (float, optional): Upper limit of the last bucket (s). Defaults to 1e4.
+            bucketsPerDecade (int, optional): Resolution of the histogram. Defaults to 20.
+        """
+        self.minValue = minValue
+        self.bucketsPerDecade = bucketsPerDecade
+        self.numBuckets = int(math.ceil(math.log10(maxValue / minValue) * bucketsPerDecade)) + 1
+        self.counts = [0] * self.numBuckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        """Adds a duration.
+
+        Args:
+            value (float): Duration (s).
+        """
+        if value <= self.minValue:
+            index = 0
+        else:
+            index = min(int(math.log10(value / self.minValue) * self.bucketsPerDecade) + 1, self.numBuckets - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Returns the upper limit of the bucket containing the given percentile.
+
+        Args:
+            p (float): Percentile (0-100).
+
+        Returns:
+            float: Duration (s). 0 if the histogram is empty.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = p / 100 * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count > 0:
+                return min(self.minValue * 10 ** (index / self.bucketsPerDecade), self.max)
+        return self.max
+
+    def summary(self):
+        """Returns the statistics of the histogram.
+
+        Returns:
+            dict: Count, mean, p50, p95, p99 and max (s).
+        """
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count > 0 else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+class CommandStats():
+    """Statistics of a single command.
+    """
+    def __init__(self):
+        self.encode = LatencyHistogram()
+        self.wait = LatencyHistogram()
+        self.decode = LatencyHistogram()
+        self.errors = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+
+    def summary(self):
+        return {
+            'encode': self.encode.summary(),
+            'wait': self.wait.summary(),
+            'decode': self.decode.summary(),
+            'errors': self.errors,
+            'bytesSent': self.bytesSent,
+            'bytesReceived': self.bytesReceived
+        }
+
+class TraceRecorder():
+    """Records the timing of every command, e.g. for a whole script run.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = []
+
+    def add(self, cmdAlias, start, encodeTime, waitTime, decodeTime, err):
+        self.events.append((cmdAlias, threading.get_ident(), start - self.start, encodeTime, waitTime, decodeTime, err))
+
+    def exportJsonLines(self, filename):
+        """Writes one JSON object per command. Times are given in seconds relative to the start of the trace.
+
+        Args:
+            filename (str): Name of the file.
+        """
+        with open(filename, 'w') as f:
+            for cmdAlias, thread, start, encodeTime, waitTime, decodeTime, err in self.events:
+                event = {'cmd': cmdAlias, 'thread': thread, 't': start, 'encode': encodeTime,
+                         'wait': waitTime, 'decode': decodeTime, 'err': err}
+                f.write(json.dumps(event) + '\n')
+
+    def exportChromeTrace(self, filename):
+        """Writes the trace in the Chrome trace event format (chrome://tracing, Perfetto).
+
+        Args:
+            filename (str): Name of the file.
+        """
+        traceEvents = []
+        for cmdAlias, thread, start, encodeTime, waitTime, decodeTime, err in self.events:
+            ts = start * 1e6
+            for phase, duration in (('encode', encodeTime), ('wait', waitTime), ('decode', decodeTime)):
+                traceEvents.append({'name': cmdAlias, 'cat': phase, 'ph': 'X', 'ts': ts,
+                                    'dur': duration * 1e6, 'pid': 1, 'tid': thread, 'args': {'err': err}})
+                ts += duration * 1e6
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': traceEvents, 'displayTimeUnit': 'ms'}, f)
+
+class CommandMetrics():
+    """Per-command latency histograms (encoding, waiting for the response, decoding),
+    error counters and transferred bytes. Optionally records a trace of all commands.
+    """
+    def __init__(self):
+        self.stats = {}
+        self.trace = None
+        self.lock = threading.Lock()
+
+    def record(self, cmdAlias, start, encodeTime, waitTime, decodeTime, bytesSent, bytesReceived, err):
+        """Records the execution of a command.
+
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            start (float): Time (time.perf_counter()) at which the request was sent.
+            encodeTime (float): Time for encoding the request (s).
+            waitTime (float): Time between sending the request and receiving the response (s).
+            decodeTime (float): Time for decoding the response (s).
+            bytesSent (int): Size of the request.
+            bytesReceived (int): Size of the response.
+            err (bool): Error.
+        """
+        with self.lock:
+            stats = self.stats.get(cmdAlias)
+            if stats is None:
+                stats = self.stats[cmdAlias] = CommandStats()
+            stats.encode.record(encodeTime)
+            stats.wait.record(waitTime)
+            stats.decode.record(decodeTime)
+            stats.bytesSent += bytesSent
+            stats.bytesReceived += bytesReceived
+            if err:
+                stats.errors += 1
+            if self.trace is not None:
+                self.trace.add(cmdAlias, start, encodeTime, waitTime, decodeTime, err)
+
+    def startTrace(self):
+        """Starts recording a trace.
+
+        Returns:
+            TraceRecorder: Trace.
+        """
+        with self.lock:
+            self.trace = TraceRecorder()
+            return self.trace
+
+    def stopTrace(self):
+        """Stops recording the trace.
+
+        Returns:
+            TraceRecorder: Recorded trace. None if no trace was recorded.
+        """
+        with self.lock:
+            trace = self.trace
+            self.trace = None
+            return trace
+
+    def reset(self):
+        """Deletes all statistics.
+        """
+        with self.lock:
+            self.stats = {}
+
+    def summary(self):
+        """Returns the statistics of all commands.
+
+        Returns:
+            dict: Statistics per command alias.
+        """
+        with self.lock:
+            return {cmdAlias: stats.summary() for cmdAlias, stats in self.stats.items()}
+
+    def exportSummary(self, filename):
+        """Writes the statistics of all commands as JSON.
+
+        Args:
+            filename (str): Name of the file.
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
@@ -0,0 +1,404 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import math
+import re
+import struct
+
+import config as cfg
+
+# Header of every request/response message: command name (32 bytes), body size (int32),
+# send response flag (uint16) and a not used field (uint16). See Nanonis TCP Protocol.
+HEADER_FORMAT = '32sihh'
+HEADER_SIZE = struct.calcsize('>' + HEADER_FORMAT)
+HEADER_STRUCT = struct.Struct('>' + HEADER_FORMAT)
+BODY_SIZE_STRUCT = struct.Struct('>32xi')
+
+INTEGER_TYPES = 'bBhHiIlLqQnN'
+FLOAT_TYPES = 'efd'
+INT32 = struct.Struct('>i')
+
+# Type of a length-prefixed value, e.g. 'f[Data rows][Data columns]' (2D array float32),
+# 's[Channel name size]' (string) or 'S[Number of channels]' (1D array string)
+SIZED_TYPE = re.compile(r'^([a-zA-Z?])((?:\[[^\]]+\])+)$')
+SIZED_TYPE_DIMS = re.compile(r'\[([^\]]+)\]')
+
+def checkBodySize(size):
+    """Checks the body size given in the header of a response message.
+
+    Args:
+        size (int): Body size (bytes).
+
+    Raises:
+        ConnectionError: If the size is negative or exceeds config.MAX_RESPONSE_SIZE, i.e. the framing of the stream is lost.
+
+    Returns:
+        int: Body size (bytes).
+    """
+    if size < 0 or size > cfg.MAX_RESPONSE_SIZE:
+        raise ConnectionError('Invalid body size {} in response header.'.format(size))
+    return size
+
+def getConverter(argType):
+    """Returns the function that converts a script argument into the value expected by struct.
+
+    Args:
+        argType (str): Format type according to the module struct().
+
+    Returns:
+        callable: Conversion function (int, float or str).
+    """
+    if argType in INTEGER_TYPES:
+        return int
+    if argType in FLOAT_TYPES:
+        return float
+    return str
+
+def getArrayConverter(conv):
+    """Returns the function that converts a list argument (or a single value) into a list of values.
+
+    Args:
+        conv (callable): Conversion function of the elements.
+
+    Returns:
+        callable: Conversion function.
+    """
+    def convert(value):
+        if isinstance(value, (str, bytes, int, float)):
+            value = [value]
+        return [conv(item) for item in value]
+    return convert
+
+def parseType(typeString):
+    """Splits a type string into the format type and the names of the size fields.
+
+    Args:
+        typeString (str): Type, e.g. 'f' or 'f[Data rows][Data columns]'.
+
+    Returns:
+        str, tuple: Format type according to the module struct(), Names of the size fields.
+    """
+    match = SIZED_TYPE.match(typeString)
+    if match is None:
+        return typeString, ()
+    return match.group(1), tuple(SIZED_TYPE_DIMS.findall(match.group(2)))
+
+class ResponseLayout():
+    """Precompiled layout of a response message.
+
+    Consecutive single values are combined into one struct.Struct. Length-prefixed
+    arrays and strings read their size from previously decoded values. Numeric arrays
+    are returned as (read-only) NumPy views of the response buffer without copying.
+    NumPy is only imported when the first array is decoded.
+    """
+    SCALARS = 0
+    ARRAY = 1
+    STRING = 2
+    STRING_ARRAY = 3
+
+    __slots__ = ('keys', 'steps', 'fixedStruct', 'hasArrays')
+
+    def __init__(self, respTypes):
+        """Compiles the layout of a response message.
+
+        Args:
+            respTypes (dict): Response types according to Number Formatting Types.
+
+        Raises:
+            ValueError: If a size field is not defined before the value that uses it.
+        """
+        steps = []
+        scalarKeys = []
+        scalarFormat = ''
+        sizeKeys = set()
+        hasArrays = False
+        for key, value in respTypes.items():
+            fmt, dims = parseType(value)
+            if len(dims) == 0:
+                scalarKeys.append(key)
+                scalarFormat += fmt
+                if fmt in INTEGER_TYPES:
+                    sizeKeys.add(key)
+                continue
+            for dim in dims:
+                if dim not in sizeKeys:
+                    raise ValueError('Size field "{}" of "{}" must be an integer defined before it.'.format(dim, key))
+            if len(scalarKeys) > 0:
+                steps.append((self.SCALARS, tuple(scalarKeys), struct.Struct('>' + scalarFormat)))
+                scalarKeys = []
+                scalarFormat = ''
+            if fmt == 's':
+                steps.append((self.STRING, key, dims[0]))
+            elif fmt == 'S':
+                steps.append((self.STRING_ARRAY, key, dims[0]))
+            else:
+                steps.append((self.ARRAY, key, '>' + fmt, dims))
+                hasArrays = True
+        if len(scalarKeys) > 0:
+            steps.append((self.SCALARS, tuple(scalarKeys), struct.Struct('>' + scalarFormat)))
+
+        set_ = object.__setattr__
+        set_(self, 'keys', tuple(respTypes.keys()))
+        set_(self, 'steps', tuple(steps))
+        # Fast path: response consists of single values only
+        if len(steps) == 1 and steps[0][0] == self.SCALARS:
+            set_(self, 'fixedStruct', steps[0][2])
+        else:
+            set_(self, 'fixedStruct', None)
+        set_(self, 'hasArrays', hasArrays)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ResponseLayout is immutable')
+
+    def decode(self, resp, offset=HEADER_SIZE):
+        """Decodes a response message.
+
+        Args:
+            resp (bytes, bytearray or memoryview): Response message.
+            offset (int, optional): Start of the body within resp. Defaults to HEADER_SIZE.
+
+        Returns:
+            dict: Decoded response message.
+        """
+        if self.fixedStruct is not None:
+            return dict(zip(self.keys, self.fixedStruct.unpack_from(resp, offset)))
+        if self.hasArrays:
+            import numpy as np
+        decoded = {}
+        for step in self.steps:
+            kind = step[0]
+            if kind == self.SCALARS:
+                decoded.update(zip(step[1], step[2].unpack_from(resp, offset)))
+                offset += step[2].size
+            elif kind == self.ARRAY:
+                shape = tuple(decoded[dim] for dim in step[3])
+                array = np.frombuffer(resp, dtype=step[2], count=math.prod(shape), offset=offset)
+                decoded[step[1]] = array.reshape(shape)
+                offset += array.nbytes
+            elif kind == self.STRING:
+                size = decoded[step[2]]
+                decoded[step[1]] = bytes(resp[offset:offset+size]).decode()
+                offset += size
+            else:
+                items = []
+                for _ in range(decoded[step[2]]):
+                    size = INT32.unpack_from(resp, offset)[0]
+                    offset += INT32.size
+                    items.append(bytes(resp[offset:offset+size]).decode())
+                    offset += size
+                decoded[step[1]] = items
+        return decoded
+
+class CommandCodec():
+    """Precompiled encoder/decoder for a single (normal) command.
+
+    The request and response layouts are compiled once from the JSON definition into
+    struct.Struct objects, so that encoding a request and decoding a response of single
+    values each require only a single call of pack() and unpack_from(). Requests with
+    length-prefixed arguments (arrays and strings) are packed segment by segment and their
+    size fields are filled in automatically. Codecs are immutable and can be shared between threads.
+    """
+    __slots__ = ('alias', 'cmdName', 'args', 'argTypes', 'respKeys', 'requestStruct',
+                 'respLayout', 'bodySize', 'defaults', 'argSlots', 'argConverters',
+                 'requestSegments', 'sizeSlots')
+
+    def __init__(self, alias, cmdDef):
+        """Compiles the request and response layout of a command.
+
+        Args:
+            alias (str): Command name/alias according to JSON files.
+            cmdDef (dict): Definition of the command (cmdName, argTypes, argValues, args, respTypes).
+
+        Raises:
+            ValueError: If the size field of an argument is not an integer defined before it.
+        """
+        argTypes = cmdDef['argTypes']
+        argValues = cmdDef['argValues']
+        respTypes = cmdDef['respTypes']
+
+        # String arguments without size field are not part of the message body (see README)
+        bodyKeys = [key for key, value in argTypes.items() if value != 's']
+        segments = []
+        sizeSlots = []
+        scalarSlots = []
+        scalarFormat = ''
+        for slot, key in enumerate(bodyKeys):
+            fmt, dims = parseType(argTypes[key])
+            if len(dims) == 0:
+                scalarSlots.append(slot)
+                scalarFormat += fmt
+                continue
+            if len(dims) != 1 or dims[0] not in bodyKeys[:slot] or argTypes[dims[0]] not in INTEGER_TYPES:
+                raise ValueError('Size field of argument "{}" must be an integer defined before it.'.format(key))
+            if len(scalarSlots) > 0:
+                segments.append((ResponseLayout.SCALARS, tuple(scalarSlots), struct.Struct('>' + scalarFormat)))
+                scalarSlots = []
+                scalarFormat = ''
+            kind = ResponseLayout.STRING if fmt == 's' else ResponseLayout.STRING_ARRAY if fmt == 'S' else ResponseLayout.ARRAY
+            segments.append((kind, slot, fmt))
+            sizeSlots.append((slot, bodyKeys.index(dims[0]), kind))
+        if len(scalarSlots) > 0:
+            segments.append((ResponseLayout.SCALARS, tuple(scalarSlots), struct.Struct('>' + scalarFormat)))
+
+        argSlots = []
+        argConverters = []
+        for arg in cmdDef['args']:
+            fmt, dims = parseType(argTypes[arg])
+            if argTypes[arg] == 's':
+                argSlots.append(None)
+            else:
+                argSlots.append(bodyKeys.index(arg))
+            if len(dims) > 0 and fmt != 's':
+                argConverters.append(getArrayConverter(getConverter(fmt)))
+            else:
+                argConverters.append(getConverter(fmt))
+
+        set_ = object.__setattr__
+        set_(self, 'alias', alias)
+        set_(self, 'cmdName', cmdDef['cmdName'].encode())
+        set_(self, 'args', tuple(cmdDef['args']))
+        set_(self, 'argTypes', tuple(argTypes[arg] for arg in cmdDef['args']))
+        set_(self, 'respKeys', tuple(respTypes.keys()))
+        set_(self, 'respLayout', ResponseLayout(respTypes))
+        set_(self, 'defaults', tuple(argValues.get(key, 0) for key in bodyKeys))
+        set_(self, 'argSlots', tuple(argSlots))
+        set_(self, 'argConverters', tuple(argConverters))
+        set_(self, 'sizeSlots', tuple(sizeSlots))
+        if len(sizeSlots) == 0:
+            # Fast path: request consists of single values only
+            requestStruct = struct.Struct('>' + HEADER_FORMAT + ''.join(argTypes[key] for key in bodyKeys))
+            set_(self, 'requestStruct', requestStruct)
+            set_(self, 'bodySize', requestStruct.size - HEADER_SIZE)
+            set_(self, 'requestSegments', None)
+        else:
+            set_(self, 'requestStruct', HEADER_STRUCT)
+            set_(self, 'bodySize', None)
+            set_(self, 'requestSegments', tuple(segments))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CommandCodec is immutable')
+
+    def convertArgs(self, cmdArgs):
+        """Converts the script arguments into the types of the command arguments.
+
+        Args:
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            tuple: Converted arguments.
+        """
+        return tuple(conv(arg) for conv, arg in zip(self.argConverters, cmdArgs))
+
+    def encode(self, cmdArgs, sendResponse=1):
+        """Encodes a request message for the given arguments.
+
+        Args:
+            cmdArgs (list): Command arguments (strings or numbers).
+            sendResponse (int, optional): Defines if the server sends a message back (=1) or not (=0). Defaults to 1.
+
+        Returns:
+            bytes: Encoded request message.
+        """
+        values = list(self.defaults)
+        for slot, conv, arg in zip(self.argSlots, self.argConverters, cmdArgs):
+            if slot is not None:
+                values[slot] = conv(arg)
+        if self.requestSegments is not None:
+            return self.encodeVariable(values, sendResponse)
+        return self.requestStruct.pack(self.cmdName, self.bodySize, sendResponse, 0, *values)
+
+    def encodeVariable(self, values, sendResponse):
+        """Encodes a request message with length-prefixed arguments. The size fields are set
+        to the number of elements (arrays) or bytes (strings) of their argument.
+
+        Args:
+            values (list): Values of all body arguments.
+            sendResponse (int): Defines if the server sends a message back (=1) or not (=0).
+
+        Returns:
+            bytes: Encoded request message.
+        """
+        for slot, sizeSlot, kind in self.sizeSlots:
+            if kind == ResponseLayout.STRING:
+                values[slot] = str(values[slot]).encode()
+            values[sizeSlot] = len(values[slot])
+        parts = [b'']
+        for segment in self.requestSegments:
+            kind = segment[0]
+            if kind == ResponseLayout.SCALARS:
+                parts.append(segment[2].pack(*[values[slot] for slot in segment[1]]))
+            elif kind == ResponseLayout.ARRAY:
+                items = values[segment[1]]
+                parts.append(struct.pack('>{}{}'.format(len(items), segment[2]), *items))
+            elif kind == ResponseLayout.STRING:
+                parts.append(values[segment[1]])
+            else:
+                for item in values[segment[1]]:
+                    item = str(item).encode()
+                    parts.append(INT32.pack(len(item)) + item)
+        parts[0] = HEADER_STRUCT.pack(self.cmdName, sum(len(part) for part in parts), sendResponse, 0)
+        return b''.join(parts)
+
+    def encodeSeries(self, cmdArgs, argIndex, series, sendResponse=1):
+        """Encodes a series of request messages in which one argument takes the values of a series.
+        All messages are packed into a single preallocated buffer.
+
+        Args:
+            cmdArgs (list): Command arguments. The argument at argIndex is replaced by the values of the series.
+            argIndex (int): Index of the argument within cmdArgs.
+            series (iterable): Values of the argument.
+            sendResponse (int, optional): Defines if the server sends a message back (=1) or not (=0). Defaults to 1.
+
+        Returns:
+            list: Encoded request messages (memoryviews of the common buffer, bytes for requests with length-prefixed arguments).
+        """
+        if self.requestSegments is not None:
+            cmdArgs = list(cmdArgs)
+            requests = []
+            for value in series:
+                cmdArgs[argIndex] = value
+                requests.append(self.encode(cmdArgs, sendResponse))
+            return requests
+        values = list(self.defaults)
+        for slot, conv, arg in zip(self.argSlots, self.argConverters, cmdArgs):
+            if slot is not None:
+                values[slot] = conv(arg)
+        slot = self.argSlots[argIndex]
+        conv = self.argConverters[argIndex]
+        series = list(series)
+        size = self.requestStruct.size
+        buffer = bytearray(size * len(series))
+        for i, value in enumerate(series):
+            values[slot] = conv(value)
+            self.requestStruct.pack_into(buffer, i * size, self.cmdName, self.bodySize, sendResponse, 0, *values)
+        view = memoryview(buffer)
+        return [view[i*size:(i+1)*size] for i in range(len(series))]
+
+    def decode(self, resp, offset=HEADER_SIZE):
+        """Decodes a response message.
+
+        Args:
+            resp (bytes, bytearray or memoryview): Response message.
+            offset (int, optional): Start of the body within resp. Defaults to HEADER_SIZE.
+
+        Returns:
+            dict: Decoded response message.
+        """
+        if len(self.respKeys) == 0:
+            return {}
+        return self.respLayout.decode(resp, offset)
+
+    @property
+    def hasArrays(self):
+        """bool: True if the decoded response references the response buffer (NumPy arrays)."""
+        return self.respLayout.hasArrays
+
+def compileCommandList(commandList):
+    """Compiles the codecs for all commands of a command list.
+
+    Args:
+        commandList (dict): Dictionary containing commands and their arguments.
+
+    Returns:
+        dict: Dictionary mapping the command alias to its CommandCodec.
+    """
+    return {alias: CommandCodec(alias, cmdDef) for alias, cmdDef in commandList.items()}
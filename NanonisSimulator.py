@@ -0,0 +1,383 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+"""Local simulator of the Nanonis TCP interface for testing and benchmarking without a microscope.
+
+Usage: python NanonisSimulator.py --port 6501 --latency 0.001 --jitter 0.0005
+
+The commands (request arguments and response values) are generated from the JSON file of the
+normal commands. Values that are set are stored and returned by the corresponding getters.
+Z (with drift and drift compensation), the scan, bias spectroscopy and the signals are modelled.
+"""
+
+import argparse
+import json
+import math
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import config as cfg
+from NanonisCodec import HEADER_SIZE, HEADER_STRUCT, INT32, ResponseLayout, parseType
+# Error status (uint32) and size of the error description (int32) appended to every response
+ERROR_STRUCT = struct.Struct('>Ii')
+
+class SimulatorModel():
+    """State of the simulated microscope.
+
+    Values that are set via a command are stored under the name of the argument and returned by
+    every command with a response value of the same name (e.g. 'Bias value (V)').
+    """
+    def __init__(self, drift=0.0, noise=0.0, scanDuration=10.0, specPoints=256):
+        """
+        Args:
+            drift (float, optional): Z drift velocity (m/s). Defaults to 0.
+            noise (float, optional): Standard deviation of the Z noise (m). Defaults to 0.
+            scanDuration (float, optional): Duration of a scan (s). Defaults to 10.
+            specPoints (int, optional): Number of points of a bias spectrum. Defaults to 256.
+        """
+        self.drift = drift
+        self.noise = noise
+        self.scanDuration = scanDuration
+        self.specPoints = specPoints
+        self.lock = threading.Lock()
+        self.values = {
+            'Z-Controller status': 1,
+            'Z-Controller setpoint': 100e-12,
+            'Bias value (V)': 0.1,
+            'Start value (V)': -1.0,
+            'End value (V)': 1.0,
+            'Saturation limit (%)': 10.0,
+        }
+        self.z0 = 0.0
+        self.t0 = time.monotonic()
+        self.scanEnd = 0.0
+        self.signals = ['Current (A)', 'Bias (V)', 'Z (m)', 'X (m)', 'Y (m)', 'LI Demod 1 X (A)', 'LI Demod 1 Y (A)']
+        self.handlers = {
+            'ZCtrl.ZPosGet': self.getZ,
+            'ZCtrl.ZPosSet': self.setZ,
+            'ZCtrl.Withdraw': self.withdraw,
+            'Scan.Action': self.scanAction,
+            'Scan.WaitEndOfScan': self.waitEndOfScan,
+            'Scan.StatusGet': self.scanStatus,
+            'Scan.FrameDataGrab': self.frameDataGrab,
+            'BiasSpectr.Start': self.biasSpectrum,
+            'Signals.NamesGet': self.signalNames,
+            'Signals.ValsGet': self.signalValues,
+        }
+
+    def velocity(self):
+        """Returns the velocity of Z, i.e. the drift minus the drift compensation (m/s).
+        """
+        if self.values.get('Z-Controller status', 0) != 1:
+            return 0.0
+        vz = self.values.get('Vz (m/s)', 0.0) if self.values.get('Compensation status', 0) == 1 else 0.0
+        return self.drift - vz
+
+    def z(self, now):
+        return self.z0 + self.velocity() * (now - self.t0)
+
+    def execute(self, cmdName, args):
+        """Executes a command.
+
+        Args:
+            cmdName (str): Name of the command (e.g. 'Bias.Set').
+            args (dict): Request arguments.
+
+        Returns:
+            dict: Response values.
+        """
+        handler = self.handlers.get(cmdName)
+        if handler is not None:
+            return handler(args)
+        with self.lock:
+            # Z continues from its current value if the drift or the feedback is changed
+            now = time.monotonic()
+            self.z0 = self.z(now)
+            self.t0 = now
+            self.values.update(args)
+            return dict(self.values)
+
+    def getZ(self, args):
+        with self.lock:
+            z = self.z(time.monotonic())
+        if self.noise > 0:
+            z += random.gauss(0, self.noise)
+        return {'Z position (m)': z}
+
+    def setZ(self, args):
+        with self.lock:
+            self.z0 = args.get('Z position (m)', 0.0)
+            self.t0 = time.monotonic()
+        return {}
+
+    def withdraw(self, args):
+        with self.lock:
+            self.values['Z-Controller status'] = 0
+            self.z0 = 0.0
+            self.t0 = time.monotonic()
+        return {}
+
+    def scanAction(self, args):
+        action = args.get('Scan action', 0)
+        with self.lock:
+            if action == 0:
+                self.scanEnd = time.monotonic() + self.scanDuration
+            elif action == 1:
+                self.scanEnd = 0.0
+        return {}
+
+    def waitEndOfScan(self, args):
+        """Like the real command, only an end of scan that occurs during the call is reported.
+        Without timeout (-1) the call waits for the next end of scan.
+        """
+        timeout = args.get('Timeout (ms)', -1)
+        start = time.monotonic()
+        deadline = start + timeout / 1000 if timeout >= 0 else math.inf
+        while True:
+            with self.lock:
+                scanEnd = self.scanEnd
+            now = time.monotonic()
+            if start < scanEnd <= now:
+                return {'Timeout status': 0}
+            if now >= deadline:
+                return {'Timeout status': 1}
+            wakeUp = min(deadline, now + 0.1)
+            if scanEnd > now:
+                wakeUp = min(wakeUp, scanEnd)
+            time.sleep(wakeUp - now)
+
+    def scanStatus(self, args):
+        with self.lock:
+            return {'Scanning status': 1 if self.scanEnd > time.monotonic() else 0}
+
+    def frameDataGrab(self, args):
+        import numpy as np
+        pixels = 64
+        y, x = np.mgrid[0:pixels, 0:pixels] / pixels
+        data = 1e-10 * np.sin(2 * math.pi * 4 * x) * np.cos(2 * math.pi * 4 * y)
+        return {'Channel name': 'Z (m)', 'Scan data': data.astype('>f4'), 'Scan direction': args.get('Data direction', 0)}
+
+    def biasSpectrum(self, args):
+        import numpy as np
+        with self.lock:
+            start = self.values.get('Start value (V)', -1.0)
+            end = self.values.get('End value (V)', 1.0)
+        bias = np.linspace(start, end, self.specPoints)
+        current = 1e-9 * np.sinh(3 * bias)
+        names = ['Bias calc (V)', 'Current (A)']
+        return {'Channels names size': sum(INT32.size + len(name) for name in names),
+                'Channels names': names, 'Data': np.vstack([bias, current]), 'Parameters': np.zeros(0)}
+
+    def signalValues(self, args):
+        with self.lock:
+            now = time.monotonic()
+            signals = [self.values.get('Z-Controller setpoint', 0.0), self.values.get('Bias value (V)', 0.0),
+                       self.z(now), self.values.get('X (m)', 0.0), self.values.get('Y (m)', 0.0)]
+        values = [signals[index] if 0 <= index < len(signals) else 0.0 for index in args.get('Signals indexes', [])]
+        return {'Signals values': values}
+
+    def signalNames(self, args):
+        return {'Signals names size': sum(INT32.size + len(name) for name in self.signals),
+                'Signals names': self.signals}
+
+class SimulatedCommand():
+    """Request and response layout of a command, generated from its JSON definition.
+    """
+    def __init__(self, cmdDef):
+        """
+        Args:
+            cmdDef (dict): Definition of the command (argTypes, respTypes).
+        """
+        argTypes = cmdDef['argTypes']
+        # String arguments are not part of the message body (see README)
+        # The request body has the same layout as a response (length-prefixed arrays and strings)
+        self.argLayout = ResponseLayout({key: value for key, value in argTypes.items() if value != 's'})
+        self.respTypes = [(key,) + parseType(value) for key, value in cmdDef['respTypes'].items()]
+        # Fast path: response consists of single values only
+        if all(len(dims) == 0 for _, _, dims in self.respTypes):
+            self.fixedStruct = struct.Struct('>' + ''.join(fmt for _, fmt, _ in self.respTypes) + 'Ii')
+        else:
+            self.fixedStruct = None
+
+    def decodeArgs(self, body):
+        """Decodes the arguments of a request. Bodies of unexpected size are ignored.
+        """
+        try:
+            return self.argLayout.decode(body, 0)
+        except (struct.error, ValueError, KeyError):
+            return {}
+
+    def encodeResponse(self, values):
+        """Encodes the response values. Missing values are 0 (empty for arrays and strings),
+        the size fields are derived from the arrays and strings.
+
+        Args:
+            values (dict): Response values.
+
+        Returns:
+            bytes: Body of the response.
+        """
+        if self.fixedStruct is not None:
+            return self.fixedStruct.pack(*[values.get(key, 0) for key, _, _ in self.respTypes], 0, 0)
+        import numpy as np
+        values = dict(values)
+        for key, fmt, dims in self.respTypes:
+            if len(dims) == 0 or key not in values:
+                continue
+            value = values[key]
+            if fmt == 's':
+                values[dims[0]] = len(value.encode())
+            elif fmt == 'S':
+                values[dims[0]] = len(value)
+            else:
+                for dim, size in zip(dims, np.shape(value)):
+                    values[dim] = size
+        parts = []
+        for key, fmt, dims in self.respTypes:
+            if len(dims) == 0:
+                parts.append(struct.pack('>' + fmt, values.get(key, 0)))
+            elif fmt == 's':
+                parts.append(values.get(key, '').encode())
+            elif fmt == 'S':
+                for item in values.get(key, []):
+                    item = item.encode()
+                    parts.append(INT32.pack(len(item)) + item)
+            else:
+                parts.append(np.asarray(values.get(key, []), dtype='>' + fmt).tobytes())
+        parts.append(ERROR_STRUCT.pack(0, 0))
+        return b''.join(parts)
+
+def loadSimulatedCommands(filename=cfg.JSON_CMD):
+    """Generates the commands from the JSON file of the normal commands.
+    If several aliases use the same command, the definition with the most response values is used.
+
+    Args:
+        filename (str, optional): JSON file of the normal commands.
+
+    Returns:
+        dict: SimulatedCommand per command name.
+    """
+    with open(filename, 'r') as f:
+        commandList = json.load(f)
+    definitions = {}
+    for cmdDef in commandList.values():
+        current = definitions.get(cmdDef['cmdName'])
+        if current is None or len(cmdDef['respTypes']) > len(current['respTypes']):
+            definitions[cmdDef['cmdName']] = cmdDef
+    return {cmdName: SimulatedCommand(cmdDef) for cmdName, cmdDef in definitions.items()}
+
+class SimulatorHandler(socketserver.BaseRequestHandler):
+    """Handles one client connection. Requests are answered in the order they are received.
+    """
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def receive(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def handle(self):
+        simulator = self.server.simulator
+        try:
+            while True:
+                header = self.receive(HEADER_SIZE)
+                name, bodySize, sendResponse, _ = HEADER_STRUCT.unpack(header)
+                body = self.receive(bodySize)
+                resp = simulator.respond(name.rstrip(b'\0').decode(), body)
+                if sendResponse:
+                    self.request.sendall(resp)
+        except (ConnectionError, OSError):
+            pass
+
+class SimulatorServer(socketserver.ThreadingTCPServer):
+    """TCP server of the simulator. The port can be reused immediately after a restart
+    and the connection threads do not keep the process alive.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+class NanonisSimulator():
+    """TCP server speaking the framing of the Nanonis TCP interface.
+    """
+    def __init__(self, host='127.0.0.1', port=6501, latency=0.0, jitter=0.0, model=None, commandFile=cfg.JSON_CMD):
+        """
+        Args:
+            host (str, optional): IP adress. Defaults to '127.0.0.1'.
+            port (int, optional): Port (0: any free port). Defaults to 6501.
+            latency (float, optional): Delay of every response (s). Defaults to 0.
+            jitter (float, optional): Random additional delay, uniformly distributed between 0 and jitter (s). Defaults to 0.
+            model (SimulatorModel, optional): State of the microscope. Defaults to None (new model).
+            commandFile (str, optional): JSON file of the normal commands.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.model = model if model is not None else SimulatorModel()
+        self.commands = loadSimulatedCommands(commandFile)
+        self.server = SimulatorServer((host, port), SimulatorHandler)
+        self.server.simulator = self
+        self.thread = None
+
+    @property
+    def address(self):
+        """tuple: IP adress and port of the server."""
+        return self.server.server_address
+
+    def respond(self, cmdName, body):
+        """Executes a request and encodes the response message.
+
+        Args:
+            cmdName (str): Name of the command.
+            body (bytes): Body of the request.
+
+        Returns:
+            bytes: Response message.
+        """
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        command = self.commands.get(cmdName)
+        if command is None:
+            respBody = ERROR_STRUCT.pack(0, 0)
+        else:
+            respBody = command.encodeResponse(self.model.execute(cmdName, command.decodeArgs(body)))
+        return HEADER_STRUCT.pack(cmdName.encode(), len(respBody), 0, 0) + respBody
+
+    def start(self):
+        """Starts the server in a background thread.
+
+        Returns:
+            tuple: IP adress and port of the server.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulator of the Nanonis TCP interface.')
+    parser.add_argument('--host', default='127.0.0.1', help='IP adress (default: 127.0.0.1).')
+    parser.add_argument('--port', type=int, default=6501, help='Port (default: 6501).')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of every response (s).')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random additional delay (s).')
+    parser.add_argument('--drift', type=float, default=0.0, help='Z drift velocity (m/s).')
+    parser.add_argument('--noise', type=float, default=0.0, help='Standard deviation of the Z noise (m).')
+    parser.add_argument('--scan-duration', type=float, default=10.0, help='Duration of a scan (s).')
+    args = parser.parse_args()
+    model = SimulatorModel(drift=args.drift, noise=args.noise, scanDuration=args.scan_duration)
+    simulator = NanonisSimulator(args.host, args.port, args.latency, args.jitter, model)
+    print('Nanonis simulator listening on {}:{}'.format(*simulator.address))
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        simulator.stop()
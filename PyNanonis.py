@@ -1,28 +1,82 @@
 # Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
 
 import json
+import logging
 import os
 import socket
 import struct
+import threading
 import time
 
-import numpy as np
-from scipy.optimize import curve_fit
-
 import config as cfg
+from CommandCache import commandFiles, fingerprint, loadCache, saveCache
+from CommandRegistry import NormalCommand, buildRegistry
+from ExternalConnections import ExternalConnectionPool, Framing
+from Metrics import CommandMetrics
+from NanonisCodec import BODY_SIZE_STRUCT, HEADER_SIZE, checkBodySize, compileCommandList
+
+logger = logging.getLogger(__name__)
+
+def messageSize(request):
+    """Returns the size of a request message given as bytes-like object or list of buffers.
+    """
+    if isinstance(request, (list, tuple)):
+        return sum(len(buf) for buf in request)
+    return len(request)
 
 class NanonisInterface():
     commandList = {}
+    commandCodecs = {}
     specialCommandList = {}
     externalInterfacesCommandLists = {}
+    registry = None
 
     def __init__(self):
         """Loads the command lists from the JSON files.
         """        
         self.connected = False
-        self.commandList = self.loadCommandList(cfg.JSON_CMD)
-        self.specialCommandList = self.loadCommandList(cfg.JSON_SPECIALCMD)
-        self.externalInterfacesCommandLists = self.loadExternalInterfaceCommandLists(cfg.FOLDER_EXTCMD)
+        self.cancelEvent = threading.Event()
+        # Serializes the request/response exchanges of different threads (script, telemetry, GUI)
+        self.linkLock = threading.RLock()
+        self.metrics = CommandMetrics()
+        self.recvBuffer = bytearray(cfg.RECV_BUFFER_SIZE)
+        self.recvView = memoryview(self.recvBuffer)
+        self.reloadCommands()
+        self.externalConnections = ExternalConnectionPool()
+
+    def loadDefinitions(self):
+        """Reads the command definitions of all JSON files. If the files did not change since
+        the last start, the parsed and validated definitions are read from the cache.
+
+        Returns:
+            tuple: Command list, special command list, external interface command lists.
+        """
+        key = fingerprint(commandFiles())
+        definitions = loadCache(cfg.CACHE_FILE, key)
+        if definitions is None:
+            definitions = (self.loadCommandList(cfg.JSON_CMD),
+                           self.loadCommandList(cfg.JSON_SPECIALCMD),
+                           self.loadExternalInterfaceCommandLists(cfg.FOLDER_EXTCMD))
+            saveCache(cfg.CACHE_FILE, key, definitions)
+        return definitions
+
+    def reloadCommands(self):
+        """Loads the command definitions and replaces the command registry.
+        The new registry is completely built before it replaces the old one, so running
+        commands and the connection are not affected. If the definitions are invalid, 
+        the old ones are kept.
+
+        Raises:
+            ValueError: If the definitions are invalid (e.g. duplicate aliases).
+        """
+        commandList, specialCommandList, externalInterfacesCommandLists = self.loadDefinitions()
+        commandCodecs = compileCommandList(commandList)
+        registry = buildRegistry(commandList, specialCommandList, externalInterfacesCommandLists, commandCodecs)
+        self.commandList = commandList
+        self.commandCodecs = commandCodecs
+        self.specialCommandList = specialCommandList
+        self.externalInterfacesCommandLists = externalInterfacesCommandLists
+        self.registry = registry
 
     def loadCommandList(self, filename):
         """Reads the predefined commands from a JSON file.
@@ -34,9 +88,29 @@ class NanonisInterface():
             dict: Dictionary containing commands and their arguments.
         """        
         with open(filename, "r") as cmd_file:
-            commandList = json.load(cmd_file)
+            commandList = json.load(cmd_file, object_pairs_hook=self.rejectDuplicateKeys)
         return commandList
 
+    def rejectDuplicateKeys(self, pairs):
+        """Creates a dictionary from the key-value pairs of a JSON object.
+        Duplicate keys (e.g. an alias defined twice) are not silently overwritten.
+
+        Args:
+            pairs (list): Key-value pairs.
+
+        Raises:
+            ValueError: If a key is defined more than once.
+
+        Returns:
+            dict: Dictionary.
+        """
+        obj = {}
+        for key, value in pairs:
+            if key in obj:
+                raise ValueError('"{}" is defined more than once.'.format(key))
+            obj[key] = value
+        return obj
+
     def loadExternalInterfaceCommandLists(self, folder):
         """Reads the predefined commands for all the external TCP interfaces from the JSON files.
 
@@ -49,8 +123,9 @@ class NanonisInterface():
         extDeviceCommandLists = []
         files = os.listdir(folder)
         for filename in files:
-            with open(os.path.join(folder, filename), "r") as cmd_file:
-                commandList = json.load(cmd_file)
+            commandList = self.loadCommandList(os.path.join(folder, filename))
+            # Validates the framing of the interface
+            Framing(commandList['Interface'])
             extDeviceCommandLists.append(commandList)
         return extDeviceCommandLists
     
@@ -78,6 +153,7 @@ class NanonisInterface():
         try:
             self.nanonis = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.nanonis.connect((ip, port))
+            self.nanonis.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.connected = True
         except:
             self.connected = False
@@ -172,46 +248,98 @@ class NanonisInterface():
 
         return request
     
-    def decodeResponseMessage(self, resp, respTypes):
-        """Decodes a response message from the Nanonis software. 
-        Currently only single values can be decoded. Arrays are not yet supported.
+    def sendBuffers(self, buffers):
+        """Sends several buffers (e.g. header and body) as one message without concatenating them.
+        Uses scatter-gather I/O if supported by the platform.
 
         Args:
-            resp (bytes): Response message from Nanonis.
-            respTypes (dict): Response types according to Number Formatting Types.
+            buffers (list): List of bytes-like objects.
+        """
+        if not hasattr(self.nanonis, 'sendmsg'):
+            self.nanonis.sendall(b''.join(buffers))
+            return
+        views = [memoryview(buf) for buf in buffers]
+        while len(views) > 0:
+            sent = self.nanonis.sendmsg(views)
+            while len(views) > 0 and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if len(views) > 0:
+                views[0] = views[0][sent:]
+
+    def receiveInto(self, view):
+        """Fills a buffer completely with data received from the Nanonis software.
+
+        Args:
+            view (memoryview): Buffer to be filled.
+        """
+        while len(view) > 0:
+            n = self.nanonis.recv_into(view)
+            if n == 0:
+                raise ConnectionError('Connection closed by the Nanonis software.')
+            view = view[n:]
+
+    def receiveResponse(self, keepBuffer=False):
+        """Reads a complete response message. First the header is read, then the body
+        according to the body size given in the header. The message is received into 
+        a reusable buffer, which is only valid until the next response is received.
+
+        Args:
+            keepBuffer (bool, optional): If True, the message is received into a new buffer 
+                owned by the caller, e.g. for arrays that reference the message. Defaults to False.
+
+        Raises:
+            ConnectionError: If the connection is closed or the body size in the header is invalid.
 
         Returns:
-            dict: Decoded response message.
-        """        
-        headerSize = 40 # Fixed
-        index = headerSize
-        decodedResp = {}
-        for key, value in respTypes.items():
-            size = len(self.convertNumberToByte(0, value))
-            decodedResp[key] = self.convertBytesToNumber(resp[index:index+size], value)
-            index += size
-        return decodedResp
-    
-    def sendRequest(self, request):
-        """Sends a data/request message to the Nanonis software.
+            memoryview: Response message including header.
+        """
+        self.receiveInto(self.recvView[:HEADER_SIZE])
+        size = HEADER_SIZE + checkBodySize(BODY_SIZE_STRUCT.unpack_from(self.recvBuffer)[0])
+        if keepBuffer:
+            view = memoryview(bytearray(size))
+            view[:HEADER_SIZE] = self.recvView[:HEADER_SIZE]
+        else:
+            if size > len(self.recvBuffer):
+                recvBuffer = bytearray(size)
+                recvBuffer[:HEADER_SIZE] = self.recvBuffer[:HEADER_SIZE]
+                self.recvBuffer = recvBuffer
+                self.recvView = memoryview(recvBuffer)
+            view = self.recvView
+        self.receiveInto(view[HEADER_SIZE:size])
+        return view[:size]
+
+    def sendRequest(self, request, keepBuffer=False):
+        """Sends a data/request message to the Nanonis software and receives the response.
 
         Args:
-            request (bytes): Request message encoded according to the Nanonis TCP Protocol.
+            request (bytes or list): Request message encoded according to the Nanonis TCP Protocol.
+                Can also be a list of buffers (e.g. header and body), which are sent without concatenation.
+            keepBuffer (bool, optional): See receiveResponse(). Defaults to False.
 
         Returns:
-            bool, bytes: Error (True/False), Encoded response message.
+            bool, memoryview: Error (True/False), Encoded response message.
         """        
         resp = ''
         err = False
         if self.connected:
-            self.nanonis.sendall(request)
-            resp = self.nanonis.recv(1024)
+            try:
+                if isinstance(request, (list, tuple)):
+                    self.sendBuffers(request)
+                else:
+                    self.nanonis.sendall(request)
+                resp = self.receiveResponse(keepBuffer)
+            except OSError:
+                # The framing of the stream is lost, therefore the connection is closed.
+                self.disconnect()
+                err = True
         else:
             err = True  
         return err, resp
           
     def command(self, cmdAlias, cmdArgs):
-        """Executes a (normal) command, i.e. a single command.
+        """Executes a command, i.e. a single command. The handler of the command 
+        (normal, special or external) is looked up in the command registry.
 
         Args:
             cmdAlias (str): Command name/alias according to JSON files.
@@ -222,123 +350,126 @@ class NanonisInterface():
         """        
         resp = ''
         err = False
-        print(cmdAlias, cmdArgs)
-        if cmdAlias in self.commandList:
-            cmdName = self.commandList[cmdAlias]['cmdName']
-            argTypes = self.commandList[cmdAlias]['argTypes']
-            argValues = self.commandList[cmdAlias]['argValues']
-            respTypes = self.commandList[cmdAlias]['respTypes']
-            if len(cmdArgs) == len(self.commandList[cmdAlias]['args']):
-                if len(cmdArgs) > 0:
-                    i = 0
-                    for arg in self.commandList[cmdAlias]['args']:
-                        if argTypes[arg] == 's':
-                            argValues[arg] = cmdArgs[i]
-                        elif argTypes[arg] == 'I':
-                            argValues[arg] = np.int(cmdArgs[i])
-                        elif argTypes[arg] == 'i':
-                            argValues[arg] = np.int(cmdArgs[i])
-                        elif argTypes[arg] == 'H':
-                            argValues[arg] = np.int(cmdArgs[i])
-                        else:
-                            argValues[arg] = np.float(cmdArgs[i])
-
-                        i += 1
-                
-                sendResponse = 1
-                request = self.encodeRequestMessage(cmdName, sendResponse, argValues, argTypes)
-                err, resp = self.sendRequest(request)
-                # Debugging
-                # resp = b'\x46\x6F\x6C\x4D\x65\x2E\x58\x59\x50\x6F\x73\x47\x65\x74\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x18\x00\x00\x00\x00\x3E\x35\x79\x8E\xE2\x30\x8C\x3A\xBE\x35\x79\x8E\xE2\x30\x8C\x3A\x00\x00\x00\x00\x00\x00\x00\x00'
-                # resp = b'FolMe.XYPosGet\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x18\x00\x00\x00\x00\xbd\x7f\x02m\x00\x00\x00\x00\xbd\x91\xe4\xa4\x80\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
-                # print(resp)
-                resp = self.decodeResponseMessage(resp, respTypes)
-        elif cmdAlias in self.specialCommandList:
-            err, resp = self.specialCommand(cmdAlias, cmdArgs)
-        elif len(self.externalInterfacesCommandLists) > 0:
-            for interfaceCmds in self.externalInterfacesCommandLists:
-                if cmdAlias in interfaceCmds:
-                    err, resp = self.externalCommand(interfaceCmds, cmdAlias, cmdArgs)
+        logger.debug('%s %s', cmdAlias, cmdArgs)
+        handler = self.registry.get(cmdAlias)
+        if handler is not None:
+            err, resp = handler.execute(self, cmdArgs)
         
         return err, resp
     
-    def specialCommand(self, cmdAlias, cmdArgs):
-        """Executes a (special) command.
-        Special commands are either compound commands or commands that require 
-        further intermediate steps or calculations. These commands are hard coded.
+    def sendCommand(self, codec, request, encodeTime=0.0):
+        """Sends an already encoded request message and decodes the response.
+
+        Args:
+            codec (CommandCodec): Codec of the command.
+            request (bytes): Request message encoded by the codec.
+            encodeTime (float, optional): Time needed to encode the request (for the metrics). Defaults to 0.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        with self.linkLock:
+            start = time.perf_counter()
+            err, resp = self.sendRequest(request, codec.hasArrays)
+            received = time.perf_counter()
+            respSize = len(resp)
+            if not err:
+                resp = codec.decode(resp)
+        self.metrics.record(codec.alias, start, encodeTime, received - start, time.perf_counter() - received,
+                            messageSize(request), respSize, err)
+        return err, resp
+
+    def sendPipelined(self, requests):
+        """Sends several already encoded request messages back-to-back and then reads
+        the responses in the same order. At most config.PIPELINE_DEPTH requests are in flight.
+        The waiting time of each command is measured from the reception of the previous response.
+
+        Args:
+            requests (list): List of tuples (codec, request).
+
+        Returns:
+            list: List of tuples (Error (True/False), Decoded response message).
+        """
+        results = []
+        if not self.connected:
+            return [(True, '')] * len(requests)
+        try:
+            for start in range(0, len(requests), cfg.PIPELINE_DEPTH):
+                chunk = requests[start:start+cfg.PIPELINE_DEPTH]
+                with self.linkLock:
+                    sent = time.perf_counter()
+                    self.sendBuffers([request for _, request in chunk])
+                    for codec, request in chunk:
+                        resp = self.receiveResponse(codec.hasArrays)
+                        received = time.perf_counter()
+                        results.append((False, codec.decode(resp)))
+                        decoded = time.perf_counter()
+                        self.metrics.record(codec.alias, sent, 0.0, received - sent, decoded - received,
+                                            len(request), len(resp), False)
+                        sent = decoded
+        except OSError:
+            self.disconnect()
+            results.extend([(True, '')] * (len(requests) - len(results)))
+        return results
+
+    def commandBatch(self, cmds):
+        """Executes several commands. Consecutive normal commands are pipelined, i.e. all 
+        requests are written back-to-back before the responses are read and decoded in order.
+        All other commands are executed one after the other via command().
 
         Args:
+            cmds (list): List of tuples (cmdAlias, cmdArgs).
+
+        Returns:
+            list: List of tuples (Error (True/False), Decoded response message).
+        """
+        results = []
+        requests = []
+        for cmdAlias, cmdArgs in cmds:
+            handler = self.registry.get(cmdAlias)
+            if isinstance(handler, NormalCommand) and len(cmdArgs) == len(handler.args):
+                requests.append((handler.codec, handler.codec.encode(cmdArgs)))
+            else:
+                results.extend(self.sendPipelined(requests))
+                requests = []
+                results.append(self.command(cmdAlias, cmdArgs))
+        results.extend(self.sendPipelined(requests))
+        return results
+
+    def encodeExternalRequest(self, interfaceCmds, cmdAlias, cmdArgs):
+        """Encodes the request string of an external command.
+
+        Args:
+            interfaceCmds (dict): Dictionary containing commands of external interface.
             cmdAlias (str): Command name/alias according to JSON files.
             cmdArgs (list): Command arguments.
 
         Returns:
-            bool, dict: Error (True/False), Decoded response message.
+            str: Request string. None if the number of arguments does not match.
         """
-        resp = ''
-        err = False
-        if cmdAlias in self.specialCommandList:
-            if len(cmdArgs) == len(self.specialCommandList[cmdAlias]['args']):
-                if cmdAlias == "addX":
-                    err, resp = self.command('getXY', [])
-                    x = resp['X (m)'] + np.float(cmdArgs[0])
-                    y = resp['Y (m)']
-                    err, resp = self.command('setXY', [x, y])
-                if cmdAlias == "addY":
-                    err, resp = self.command('getXY', [])
-                    x = resp['X (m)']
-                    y = resp['Y (m)'] + np.float(cmdArgs[0])
-                    err, resp = self.command('setXY', [x, y])
-                if cmdAlias == "addZ":
-                    err, resp = self.command('getZ', [])
-                    z = resp['Z position (m)'] + np.float(cmdArgs[0])
-                    err, resp = self.command('setZ', [z])
-                if cmdAlias == "addCurrent":
-                    err, resp = self.command('getCurrent', [])
-                    current = resp['Z-Controller setpoint'] + np.float(cmdArgs[0])
-                    err, resp = self.command('setCurrent', [current])
-                if cmdAlias == "addBias":
-                    err, resp = self.command('getBias', [])
-                    bias = resp['Bias value (V)'] + np.float(cmdArgs[0])
-                    err, resp = self.command('setBias', [bias])
-                if cmdAlias == "correctZDrift":
-                    err, resp = self.command('getDriftComp', [])
-                    comp_status = resp['Compensation status']
-                    old_vx = resp['Vx (m/s)']
-                    old_vy = resp['Vy (m/s)']
-                    old_vz = resp['Vz (m/s)']
-
-                    dt = 1 
-                    n = int(np.float(cmdArgs[0]) / dt)
-                    t_data = np.zeros(n)
-                    z_data = np.zeros(n)
-
-                    for i in range(len(t_data)):
-                        err, resp = self.command('getZ', [])
-                        z = resp['Z position (m)']
-                        t_data[i] = dt * i
-                        z_data[i] = z
-                        time.sleep(int(dt))
-
-                    def lin_func(x, m, b):
-                        return x * m + b
-
-                    popt, _ = curve_fit(lin_func, t_data, z_data)
-                    vz = popt[0]
-
-                    if comp_status == 1:
-                        new_vz = old_vz + vz
-                    else:
-                        old_vx = 0
-                        old_vy = 0
-                        new_vz = vz
-                    err, resp = self.command('setDriftComp', [1, old_vx, old_vy, new_vz])
-                if cmdAlias == "wait":
-                    time.sleep(np.float(cmdArgs[0]))
+        cmdName = interfaceCmds[cmdAlias]['cmdName']
+        argTypes = interfaceCmds[cmdAlias]['argTypes']
+        argValues = dict(interfaceCmds[cmdAlias]['argValues'])
 
-        return err, resp
+        if len(cmdArgs) != len(interfaceCmds[cmdAlias]['args']):
+            return None
+
+        argList = ''
+        if len(cmdArgs) > 0:
+            i = 0
+            for arg in interfaceCmds[cmdAlias]['args']:
+                if argTypes[arg] == 's':
+                    argValues[arg] = cmdArgs[i]
+                i += 1
+
+            for _, value in argValues.items():
+                argList += " " + value            
+
+        return cmdName + argList
 
     def externalCommand(self, interfaceCmds, cmdAlias, cmdArgs):
         """Executes an external command. The commands are sent to the external interfaces via TCP.
+        The connections to the interfaces are pooled and kept open if the interface declares a framing.
 
         Args:
             interfaceCmds (dict): Dictionary containing commands of external interface.
@@ -352,37 +483,21 @@ class NanonisInterface():
         err = False
 
         interface = interfaceCmds['Interface']
-        cmdName = interfaceCmds[cmdAlias]['cmdName']
-        argTypes = interfaceCmds[cmdAlias]['argTypes']
-        argValues = interfaceCmds[cmdAlias]['argValues']
-        
-        request = ''
-        argList = ''
+        request = self.encodeExternalRequest(interfaceCmds, cmdAlias, cmdArgs)
 
-        if len(cmdArgs) == len(interfaceCmds[cmdAlias]['args']):
-            if len(cmdArgs) > 0:
-                i = 0
-                for arg in interfaceCmds[cmdAlias]['args']:
-                    if argTypes[arg] == 's':
-                        argValues[arg] = cmdArgs[i]
-                    i += 1
-
-                for _, value in argValues.items():
-                    argList += " " + value            
-
-            request = cmdName + argList
-            print(request)
+        if request is not None:
+            logger.debug('%s', request)
 
+            start = time.perf_counter()
+            respSize = 0
             try:
-                self.externalInterface = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.externalInterface.connect((interface['IP-Adress'], interface['Port']))
-
-                self.externalInterface.sendall(request.encode())
-                resp = self.externalInterface.recv(1024).decode()
-
-                self.externalInterface.close()            
-            except:
+                connection = self.externalConnections.get(interface)
+                resp = connection.request(request.encode())
+                respSize = len(resp)
+                resp = resp.decode()
+            except OSError:
                 err = True
                 resp = "Could not connect to external interface."
+            self.metrics.record(cmdAlias, start, 0.0, time.perf_counter() - start, 0.0, len(request), respSize, err)
 
         return err, resp
\ No newline at end of file
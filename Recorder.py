@@ -0,0 +1,281 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+import config as cfg
+
+SIDECAR = 'recording.json'
+
+class Column():
+    """Values of a single field, stored in preallocated .npy files (chunks) that are written via memory mapping.
+    Chunks are sized in bytes: the first chunk has firstChunkBytes, every further chunk twice the size of the
+    previous one up to chunkBytes (at least one row). Appending is O(1) and only the current chunk is mapped.
+    The last chunk is truncated to the written rows when the column is closed.
+    """
+    def __init__(self, directory, name, dtype, shape, chunkBytes, firstChunkBytes):
+        """
+        Args:
+            directory (str): Folder of the chunk files.
+            name (str): File name prefix of the column.
+            dtype (numpy.dtype): Data type of the values.
+            shape (tuple): Shape of a single value (() for scalars).
+            chunkBytes (int): Maximum size of a chunk (bytes).
+            firstChunkBytes (int): Size of the first chunk (bytes).
+        """
+        self.directory = directory
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.chunkBytes = chunkBytes
+        self.firstChunkBytes = firstChunkBytes
+        self.files = []
+        self.counts = []
+        self.chunk = None
+
+    def append(self, value):
+        """Appends a value.
+
+        Args:
+            value (float or numpy.ndarray): Value with the shape of the column.
+
+        Raises:
+            ValueError: If the shape of the value differs from the shape of the column.
+        """
+        self.check(value)
+        if self.chunk is None or self.counts[-1] == len(self.chunk):
+            self.nextChunk()
+        self.chunk[self.counts[-1]] = value
+        self.counts[-1] += 1
+
+    def check(self, value):
+        """Checks if a value can be appended.
+
+        Args:
+            value (float or numpy.ndarray): Value.
+
+        Raises:
+            ValueError: If the shape of the value differs from the shape of the column.
+        """
+        if np.shape(value) != self.shape:
+            raise ValueError('Shape {} differs from the recorded shape {}.'.format(np.shape(value), self.shape))
+
+    def nextChunk(self):
+        """Closes the current chunk and creates the next one.
+        """
+        self.flush()
+        rowBytes = max(self.dtype.itemsize * math.prod(self.shape), 1)
+        chunkBytes = min(self.firstChunkBytes * 2 ** len(self.files), self.chunkBytes)
+        filename = '{}_{:04d}.npy'.format(self.name, len(self.files))
+        self.chunk = np.lib.format.open_memmap(os.path.join(self.directory, filename), mode='w+',
+                                               dtype=self.dtype, shape=(max(chunkBytes // rowBytes, 1),) + self.shape)
+        self.files.append(filename)
+        self.counts.append(0)
+
+    def flush(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+
+    def close(self):
+        """Flushes the current chunk and truncates it to the written rows.
+        """
+        if self.chunk is None:
+            return
+        self.flush()
+        count = self.counts[-1]
+        if count < len(self.chunk):
+            filename = os.path.join(self.directory, self.files[-1])
+            with open(filename + '.tmp', 'wb') as f:
+                np.save(f, self.chunk[:count])
+            # The mapping has to be released before the file is replaced (Windows)
+            self.chunk = None
+            os.replace(filename + '.tmp', filename)
+        self.chunk = None
+
+    def description(self):
+        return {'dtype': self.dtype.str, 'shape': list(self.shape), 'files': self.files, 'counts': self.counts}
+
+class RecordStream():
+    """Recorded samples of one source (e.g. a command). Every sample has a monotonic timestamp
+    and a value for each field; all columns of a stream have the same number of rows.
+    """
+    def __init__(self, directory, name, chunkBytes, firstChunkBytes):
+        """
+        Args:
+            directory (str): Folder of the stream.
+            name (str): Name of the stream.
+            chunkBytes (int): Maximum size of a chunk (bytes).
+            firstChunkBytes (int): Size of the first chunk (bytes).
+        """
+        self.directory = directory
+        self.name = name
+        self.chunkBytes = chunkBytes
+        self.firstChunkBytes = firstChunkBytes
+        self.time = None
+        self.columns = {}
+        self.rows = 0
+
+    def append(self, t, values):
+        """Appends a sample.
+
+        Args:
+            t (float): Monotonic timestamp (s).
+            values (dict): Values of the fields.
+
+        Raises:
+            ValueError: If the fields or their shapes differ from the first sample. Nothing is appended in this case.
+        """
+        if self.time is not None:
+            if values.keys() != self.columns.keys():
+                raise ValueError('Fields of stream "{}" differ from the first sample.'.format(self.name))
+            for field, value in values.items():
+                try:
+                    self.columns[field].check(value)
+                except ValueError as e:
+                    raise ValueError('Field "{}" of stream "{}": {}'.format(field, self.name, e))
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            self.time = Column(self.directory, 'time', np.float64, (), self.chunkBytes, self.firstChunkBytes)
+            for index, (field, value) in enumerate(values.items()):
+                dtype = value.dtype if isinstance(value, np.ndarray) else np.float64
+                self.columns[field] = Column(self.directory, 'field{}'.format(index), dtype, np.shape(value),
+                                             self.chunkBytes, self.firstChunkBytes)
+        for field, value in values.items():
+            self.columns[field].append(value)
+        self.time.append(t)
+        self.rows += 1
+
+    def close(self):
+        if self.time is not None:
+            self.time.close()
+            for column in self.columns.values():
+                column.close()
+
+    def description(self):
+        return {'directory': os.path.basename(self.directory), 'rows': self.rows,
+                'time': self.time.description() if self.time is not None else None,
+                'fields': {field: column.description() for field, column in self.columns.items()}}
+
+class Recorder():
+    """Records sampled values (e.g. response fields of commands) into a folder.
+
+    Each stream is stored column by column in chunked .npy files. The JSON sidecar
+    "recording.json" describes the streams, fields, data types and chunk files. It is
+    updated whenever a chunk is completed and when the recorder is closed. Nothing is
+    written until the first sample is recorded. Samples can be appended from several threads.
+    """
+    def __init__(self, directory, chunkBytes=cfg.RECORD_CHUNK_BYTES, firstChunkBytes=cfg.RECORD_FIRST_CHUNK_BYTES):
+        """
+        Args:
+            directory (str): Folder of the recording.
+            chunkBytes (int, optional): Maximum size of a chunk file (bytes).
+            firstChunkBytes (int, optional): Size of the first chunk file of a column (bytes).
+        """
+        self.directory = directory
+        self.chunkBytes = chunkBytes
+        self.firstChunkBytes = firstChunkBytes
+        self.streams = {}
+        self.created = time.time()
+        self.monotonicStart = time.monotonic()
+        self.lock = threading.Lock()
+
+    def append(self, stream, values, t=None):
+        """Appends a sample to a stream. Only numeric values (numbers and NumPy arrays) are recorded.
+
+        Args:
+            stream (str): Name of the stream.
+            values (dict): Values of the fields.
+            t (float, optional): Monotonic timestamp (time.monotonic()). Defaults to None (now).
+
+        Raises:
+            ValueError: If the fields or their shapes differ from the first sample of the stream. Nothing is appended in this case.
+        """
+        if t is None:
+            t = time.monotonic()
+        values = {field: value for field, value in values.items()
+                  if isinstance(value, (int, float, np.ndarray, np.number)) and not isinstance(value, bool)}
+        with self.lock:
+            recordStream = self.streams.get(stream)
+            if recordStream is None:
+                directory = os.path.join(self.directory, 'stream{}'.format(len(self.streams)))
+                recordStream = self.streams[stream] = RecordStream(directory, stream, self.chunkBytes, self.firstChunkBytes)
+            chunks = len(recordStream.time.files) if recordStream.time is not None else 0
+            recordStream.append(t - self.monotonicStart, values)
+            if len(recordStream.time.files) != chunks:
+                self.writeSidecar()
+
+    def writeSidecar(self):
+        """Writes the description of the recording. The file is replaced atomically.
+        """
+        sidecar = {'created': self.created, 'chunkBytes': self.chunkBytes,
+                   'streams': {name: stream.description() for name, stream in self.streams.items()}}
+        filename = os.path.join(self.directory, SIDECAR)
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(sidecar, f, indent=4)
+        os.replace(filename + '.tmp', filename)
+
+    def close(self):
+        """Flushes all chunks and writes the sidecar.
+        """
+        with self.lock:
+            if len(self.streams) == 0:
+                return
+            for stream in self.streams.values():
+                stream.close()
+            self.writeSidecar()
+
+def loadRecording(directory):
+    """Reads a recording. The chunks are memory-mapped, i.e. they are only read when accessed.
+
+    Args:
+        directory (str): Folder of the recording.
+
+    Returns:
+        dict: Per stream a dictionary with the time ('time', s since the start of the recording) and the fields.
+    """
+    with open(os.path.join(directory, SIDECAR), 'r') as f:
+        sidecar = json.load(f)
+    recording = {}
+    for name, stream in sidecar['streams'].items():
+        folder = os.path.join(directory, stream['directory'])
+        columns = {'time': stream['time']}
+        columns.update(stream['fields'])
+        data = {}
+        for field, column in columns.items():
+            chunks = [np.load(os.path.join(folder, filename), mmap_mode='r')[:count]
+                      for filename, count in zip(column['files'], column['counts'])]
+            data[field] = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+        recording[name] = data
+    return recording
+
+def recordCommand(nni, recorder, cmdAlias, cmdArgs, fields=None, stream=None):
+    """Executes a command and records the fields of its response. The timestamp is
+    the middle between sending the request and receiving the response.
+
+    Args:
+        nni (NanonisInterface): Interface used to execute the command.
+        recorder (Recorder): Recorder.
+        cmdAlias (str): Command name/alias according to JSON files.
+        cmdArgs (list): Command arguments.
+        fields (list, optional): Fields of the response to record. Defaults to None (all numeric fields).
+        stream (str, optional): Name of the stream. Defaults to None (alias of the command).
+
+    Raises:
+        ValueError: If the fields or their shapes differ from the first sample of the stream.
+
+    Returns:
+        bool, dict: Error (True/False), Decoded response message.
+    """
+    before = time.monotonic()
+    err, resp = nni.command(cmdAlias, cmdArgs)
+    after = time.monotonic()
+    if not err and isinstance(resp, dict):
+        if fields is not None:
+            resp = {field: resp[field] for field in fields}
+        recorder.append(stream if stream is not None else cmdAlias, resp, (before + after) / 2)
+    return err, resp
@@ -0,0 +1,284 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import math
+import time
+
+import config as cfg
+
+# Maps the alias of a special command to the class implementing it
+SPECIAL_COMMANDS = {}
+
+def registerSpecialCommand(cmdAlias):
+    """Class decorator that registers the implementation of a special command.
+    The command must also be defined in the JSON file of the special commands.
+
+    Args:
+        cmdAlias (str): Command name/alias according to JSON files.
+    """
+    def register(cls):
+        SPECIAL_COMMANDS[cmdAlias] = cls
+        return cls
+    return register
+
+class SpecialCommand():
+    """Base class of the special commands.
+    Special commands are either compound commands or commands that require
+    further intermediate steps or calculations. Subclasses implement run().
+    """
+    kind = 'special'
+
+    def __init__(self, cmdAlias, cmdDef):
+        """
+        Args:
+            cmdAlias (str): Command name/alias according to JSON files.
+            cmdDef (dict): Definition of the command (argTypes, args).
+        """
+        self.alias = cmdAlias
+        self.args = tuple(cmdDef['args'])
+        self.argTypes = tuple(cmdDef['argTypes'][arg] for arg in cmdDef['args'])
+
+    def execute(self, nni, cmdArgs):
+        """Executes the command if the number of arguments is correct.
+
+        Args:
+            nni (NanonisInterface): Interface used to execute the (inner) commands.
+            cmdArgs (list): Command arguments.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        if len(cmdArgs) != len(self.args):
+            return False, ''
+        return self.run(nni, cmdArgs)
+
+    def run(self, nni, cmdArgs):
+        raise NotImplementedError
+
+class AddValue(SpecialCommand):
+    """Reads a value, adds the argument to it and sets the new value.
+    """
+    getter = None
+    setter = None
+    key = None
+
+    def run(self, nni, cmdArgs):
+        err, resp = nni.command(self.getter, [])
+        if err:
+            return err, resp
+        return nni.command(self.setter, [resp[self.key] + float(cmdArgs[0])])
+
+@registerSpecialCommand('addX')
+class AddX(SpecialCommand):
+    def run(self, nni, cmdArgs):
+        err, resp = nni.command('getXY', [])
+        if err:
+            return err, resp
+        x = resp['X (m)'] + float(cmdArgs[0])
+        y = resp['Y (m)']
+        return nni.command('setXY', [x, y])
+
+@registerSpecialCommand('addY')
+class AddY(SpecialCommand):
+    def run(self, nni, cmdArgs):
+        err, resp = nni.command('getXY', [])
+        if err:
+            return err, resp
+        x = resp['X (m)']
+        y = resp['Y (m)'] + float(cmdArgs[0])
+        return nni.command('setXY', [x, y])
+
+@registerSpecialCommand('addZ')
+class AddZ(AddValue):
+    getter = 'getZ'
+    setter = 'setZ'
+    key = 'Z position (m)'
+
+@registerSpecialCommand('addCurrent')
+class AddCurrent(AddValue):
+    getter = 'getCurrent'
+    setter = 'setCurrent'
+    key = 'Z-Controller setpoint'
+
+@registerSpecialCommand('addBias')
+class AddBias(AddValue):
+    getter = 'getBias'
+    setter = 'setBias'
+    key = 'Bias value (V)'
+
+class RunningLinearFit():
+    """Incremental least-squares fit of a straight line y = m * x + b.
+    Each sample updates the means and co-moments (Welford), so the memory is O(1)
+    and the slope and its standard error are available after every sample.
+    """
+    def __init__(self):
+        self.n = 0
+        self.meanX = 0.0
+        self.meanY = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+        self.syy = 0.0
+
+    def add(self, x, y):
+        """Adds a sample.
+
+        Args:
+            x (float): Independent variable (e.g. time).
+            y (float): Dependent variable (e.g. Z position).
+        """
+        self.n += 1
+        dx = x - self.meanX
+        dy = y - self.meanY
+        self.meanX += dx / self.n
+        self.meanY += dy / self.n
+        self.sxx += dx * (x - self.meanX)
+        self.sxy += dx * (y - self.meanY)
+        self.syy += dy * (y - self.meanY)
+
+    def slope(self):
+        """Returns the slope m of the fitted line.
+
+        Returns:
+            float: Slope.
+        """
+        if self.sxx <= 0:
+            return 0.0
+        return self.sxy / self.sxx
+
+    def intercept(self):
+        """Returns the intercept b of the fitted line.
+
+        Returns:
+            float: Intercept.
+        """
+        return self.meanY - self.slope() * self.meanX
+
+    def slopeError(self):
+        """Returns the standard error of the slope.
+
+        Returns:
+            float: Standard error of the slope. Infinite for less than three samples.
+        """
+        if self.n < 3 or self.sxx <= 0:
+            return math.inf
+        residuals = max(self.syy - self.sxy * self.sxy / self.sxx, 0.0)
+        return math.sqrt(residuals / (self.n - 2) / self.sxx)
+
+class ZDriftCorrection(SpecialCommand):
+    """Estimates the Z drift velocity from a linear fit of Z(t) and corrects it with the drift compensation.
+    The samples are fitted incrementally while they are acquired. The measurement can be cancelled
+    via nni.cancelEvent, in which case the drift compensation is not changed.
+    """
+    minSamples = 10
+
+    def estimate(self, nni, duration, rate, target):
+        """Samples Z and fits the drift velocity.
+
+        Args:
+            nni (NanonisInterface): Interface used to execute the commands.
+            duration (float): Maximum duration of the measurement (s).
+            rate (float): Sample rate (Hz). If 0, Z is sampled as fast as the connection allows.
+            target (float): Standard error of the velocity (m/s) at which the measurement stops early. 0: Never.
+
+        Returns:
+            bool, RunningLinearFit: Error/cancelled (True/False), Fit of Z(t).
+        """
+        fit = RunningLinearFit()
+        interval = 1 / rate if rate > 0 else 0
+        start = time.perf_counter()
+        nextSample = start
+        while True:
+            before = time.perf_counter()
+            err, resp = nni.command('getZ', [])
+            if err:
+                return True, fit
+            after = time.perf_counter()
+            fit.add((before + after) / 2 - start, resp['Z position (m)'])
+            if target > 0 and fit.n >= self.minSamples and fit.slopeError() <= target:
+                return False, fit
+            nextSample += interval
+            if max(nextSample, after) - start >= duration:
+                return False, fit
+            if interval > 0:
+                cancelled = nni.cancelEvent.wait(max(nextSample - after, 0))
+            else:
+                cancelled = nni.cancelEvent.is_set()
+            if cancelled:
+                return True, fit
+
+    def correct(self, nni, duration, rate, target):
+        """Measures the drift and updates the drift compensation.
+
+        Args:
+            nni (NanonisInterface): Interface used to execute the commands.
+            duration (float): Maximum duration of the measurement (s).
+            rate (float): Sample rate (Hz). If 0, Z is sampled as fast as the connection allows.
+            target (float): Standard error of the velocity (m/s) at which the measurement stops early. 0: Never.
+
+        Returns:
+            bool, dict: Error (True/False), Decoded response message.
+        """
+        err, resp = nni.command('getDriftComp', [])
+        if err:
+            return err, resp
+        comp_status = resp['Compensation status']
+        old_vx = resp['Vx (m/s)']
+        old_vy = resp['Vy (m/s)']
+        old_vz = resp['Vz (m/s)']
+
+        err, fit = self.estimate(nni, duration, rate, target)
+        if err or fit.n < 2:
+            return True, ''
+        vz = fit.slope()
+
+        if comp_status == 1:
+            new_vz = old_vz + vz
+        else:
+            old_vx = 0
+            old_vy = 0
+            new_vz = vz
+        return nni.command('setDriftComp', [1, old_vx, old_vy, new_vz])
+
+@registerSpecialCommand('correctZDrift')
+class CorrectZDrift(ZDriftCorrection):
+    """Measures the Z drift for the given time with one sample per second.
+    """
+    def run(self, nni, cmdArgs):
+        return self.correct(nni, float(cmdArgs[0]), 1, 0)
+
+@registerSpecialCommand('correctZDriftFast')
+class CorrectZDriftFast(ZDriftCorrection):
+    """Measures the Z drift at the given sample rate (0: as fast as possible) until the 
+    standard error of the velocity reaches the target or the maximum time has elapsed.
+    """
+    def run(self, nni, cmdArgs):
+        return self.correct(nni, float(cmdArgs[0]), float(cmdArgs[1]), float(cmdArgs[2]))
+
+@registerSpecialCommand('wait')
+class Wait(SpecialCommand):
+    """Waits for the given time. The wait ends immediately if nni.cancelEvent is set.
+    """
+    def run(self, nni, cmdArgs):
+        nni.cancelEvent.wait(float(cmdArgs[0]))
+        return False, ''
+
+@registerSpecialCommand('waitEndScan')
+class WaitEndScan(SpecialCommand):
+    """Waits for the end of the scan. The Nanonis software is asked repeatedly with a timeout of
+    config.WAIT_END_SCAN_TIMEOUT, so that the connection is not blocked for the whole scan
+    (other commands are executed in between) and the wait can be cancelled via nni.cancelEvent.
+    Scan.WaitEndOfScan only reports an end of scan that occurs during the call. Therefore the
+    scan status is read after each timeout, so that an end between two calls is not missed.
+    """
+    def run(self, nni, cmdArgs):
+        while not nni.cancelEvent.is_set():
+            err, resp = nni.command('waitEndScanTimeout', [cfg.WAIT_END_SCAN_TIMEOUT])
+            if err:
+                return err, resp
+            if resp['Timeout status'] == 0:
+                break
+            err, resp = nni.command('getScanStatus', [])
+            if err:
+                return err, resp
+            if resp['Scanning status'] == 0:
+                break
+        return False, ''
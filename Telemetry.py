@@ -0,0 +1,79 @@
+# Copyright (c) 2022-2025 Taner Esat <t.esat@fz-juelich.de>
+
+import logging
+import threading
+
+from PySide6 import QtCore
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+class Telemetry(QtCore.QThread):
+    """Polls a set of getters (e.g. current, bias, Z, XY, feedback) in the background.
+
+    All getters are read in one pipelined batch. The response of a getter is only
+    published via valueChanged if it differs from the last one. While the link is
+    busy (e.g. a script is running), the polling interval is increased.
+    """
+    valueChanged = QtCore.Signal(str, object)
+
+    def __init__(self, nni, getters=cfg.TELEMETRY_GETTERS, interval=cfg.TELEMETRY_INTERVAL,
+                 busyInterval=cfg.TELEMETRY_BUSY_INTERVAL, isBusy=None):
+        """
+        Args:
+            nni (NanonisInterface): Interface used to execute the getters.
+            getters (list, optional): Aliases of the getters (commands without arguments).
+            interval (float, optional): Polling interval (s).
+            busyInterval (float, optional): Polling interval (s) while the link is busy.
+            isBusy (callable, optional): Returns True while the link is busy. Defaults to None.
+        """
+        super(Telemetry, self).__init__()
+        self.nni = nni
+        self.getters = list(getters)
+        self.interval = interval
+        self.busyInterval = busyInterval
+        self.isBusy = isBusy
+        self.values = {}
+        self.stopped = False
+        self.wakeEvent = threading.Event()
+
+    def run(self):
+        while not self.stopped:
+            if self.nni.connected:
+                try:
+                    self.poll()
+                except Exception as e:
+                    # E.g. the executor is stopped during shutdown; the cycle is skipped
+                    logger.debug('Telemetry poll failed: %s', e)
+            busy = self.isBusy is not None and self.isBusy()
+            self.wakeEvent.wait(self.busyInterval if busy else self.interval)
+            self.wakeEvent.clear()
+
+    def poll(self):
+        """Reads all getters and publishes the changed values.
+        """
+        results = self.nni.commandBatch([(getter, []) for getter in self.getters])
+        for getter, (err, resp) in zip(self.getters, results):
+            if err or not isinstance(resp, dict):
+                continue
+            if self.values.get(getter) != resp:
+                self.values[getter] = resp
+                self.valueChanged.emit(getter, resp)
+
+    def refresh(self, clear=False):
+        """Polls immediately.
+
+        Args:
+            clear (bool, optional): Forget the last values, so that all values are published again. Defaults to False.
+        """
+        if clear:
+            self.values = {}
+        self.wakeEvent.set()
+
+    def stop(self):
+        """Stops polling and waits for the thread to finish.
+        """
+        self.stopped = True
+        self.wakeEvent.set()
+        self.wait()
@@ -16,8 +16,8 @@ from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
     QIcon, QImage, QKeySequence, QLinearGradient,
     QPainter, QPalette, QPixmap, QRadialGradient,
     QTransform)
-from PySide6.QtWidgets import (QApplication, QDoubleSpinBox, QFrame, QGroupBox,
-    QHeaderView, QLabel, QLineEdit, QMainWindow,
+from PySide6.QtWidgets import (QAbstractItemView, QApplication, QDoubleSpinBox, QFrame, QGroupBox,
+    QHeaderView, QLabel, QLineEdit, QListView, QMainWindow,
     QMenu, QMenuBar, QPlainTextEdit, QPushButton,
     QSizePolicy, QTabWidget, QTableWidget, QTableWidgetItem,
     QWidget)
@@ -283,11 +283,16 @@ class Ui_Aunis(object):
         self.status_Disconnect.setGeometry(QRect(90, 50, 81, 24))
         self.status_Disconnect.setFont(font)
         self.status_Disconnect.setStyleSheet(u"")
-        self.status_Log = QPlainTextEdit(self.centralwidget)
+        self.status_LogFilter = QLineEdit(self.centralwidget)
+        self.status_LogFilter.setObjectName(u"status_LogFilter")
+        self.status_LogFilter.setGeometry(QRect(10, 340, 551, 22))
+        self.status_LogFilter.setClearButtonEnabled(True)
+        self.status_Log = QListView(self.centralwidget)
         self.status_Log.setObjectName(u"status_Log")
         self.status_Log.setEnabled(True)
-        self.status_Log.setGeometry(QRect(10, 340, 551, 121))
-        self.status_Log.setReadOnly(True)
+        self.status_Log.setGeometry(QRect(10, 366, 551, 95))
+        self.status_Log.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.status_Log.setUniformItemSizes(True)
         Aunis.setCentralWidget(self.centralwidget)
         self.menubar = QMenuBar(Aunis)
         self.menubar.setObjectName(u"menubar")
@@ -364,6 +369,7 @@ class Ui_Aunis(object):
         self.status_Refresh.setText(QCoreApplication.translate("Aunis", u"\u27f3", None))
         self.status_Connect.setText(QCoreApplication.translate("Aunis", u"Connect", None))
         self.status_Disconnect.setText(QCoreApplication.translate("Aunis", u"Disconnect", None))
+        self.status_LogFilter.setPlaceholderText(QCoreApplication.translate("Aunis", u"Filter log", None))
         self.menuHelp.setTitle(QCoreApplication.translate("Aunis", u"Help", None))
         self.menuFile.setTitle(QCoreApplication.translate("Aunis", u"File", None))
     # retranslateUi
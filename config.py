@@ -1,3 +1,26 @@
 JSON_CMD = "cmds/commands.json"
 JSON_SPECIALCMD = "cmds/special_commands.json"
-FOLDER_EXTCMD = "cmds/external"
\ No newline at end of file
+FOLDER_EXTCMD = "cmds/external"
+RECV_BUFFER_SIZE = 65536
+MAX_RESPONSE_SIZE = 268435456
+PIPELINE_DEPTH = 32
+TRACE_SCRIPTS = False
+LOG_FLUSH_LINES = 256
+LOG_FLUSH_INTERVAL = 0.5
+LOG_MAX_BYTES = 10485760
+LOG_BACKUP_COUNT = 5
+LOG_VIEW_CAPACITY = 10000
+LOG_VIEW_REFRESH_INTERVAL = 100
+TELEMETRY_GETTERS = ["getCurrent", "getBias", "getZ", "getXY", "getFeedback"]
+TELEMETRY_INTERVAL = 0.5
+TELEMETRY_BUSY_INTERVAL = 5
+AUTOCOMPLETE_DELAY = 150
+CACHE_FILE = "cmds/.cache/commands.pickle"
+WATCH_INTERVAL = 1
+RECORD_CHUNK_BYTES = 67108864
+RECORD_FIRST_CHUNK_BYTES = 1048576
+SPEC_TWO_OPT_PASSES = 10
+WAIT_END_SCAN_TIMEOUT = 100
+WAIT_UNTIL_MIN_INTERVAL = 0.02
+WAIT_UNTIL_MAX_INTERVAL = 2
+BLOCKING_COMMANDS = ["BiasSpectr.Start", "Scan.WaitEndOfScan", "FolMe.XYPosSet", "ZCtrl.Withdraw"]